@@ -40,9 +40,10 @@ setup(
         "tqdm>=4.65.0",
     ],
     extras_require={
-        "web": ["fastapi>=0.100.0", "uvicorn>=0.23.0", "python-multipart>=0.0.6"],
+        "web": ["fastapi>=0.100.0", "uvicorn[standard]>=0.23.0", "python-multipart>=0.0.6"],
         "dev": ["pytest>=7.4.0", "pytest-cov>=4.1.0", "black>=23.0.0", "flake8>=6.0.0", "mypy>=1.4.0"],
-        "advanced": ["opencv-python>=4.8.0", "numpy>=1.24.0"],
+        "advanced": ["opencv-python>=4.8.0", "numpy>=1.24.0", "numba>=0.58.0"],
+        "fast": ["orjson>=3.8.0"],
     },
     entry_points={
         "console_scripts": [
@@ -2,12 +2,32 @@
 Livestream Splitter - Split long livestream recordings into smaller segments
 """
 
+from typing import Any, List
+
 __version__ = "0.1.0"
 __author__ = "Your Name"
 __email__ = "your.email@example.com"
 
-from .splitter import Splitter
-from .video_processor import VideoProcessor
-from .config import Config
+__all__ = ["Splitter", "VideoProcessor", "Config"]
+
+# Public classes are imported on first access (PEP 562) so that importing the
+# package, e.g. for the CLI's --help, does not load pydantic, ffmpeg or tqdm
+_LAZY_IMPORTS = {
+    "Splitter": ".splitter",
+    "VideoProcessor": ".video_processor",
+    "Config": ".config",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_IMPORTS:
+        import importlib
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-__all__ = ["Splitter", "VideoProcessor", "Config"]
\ No newline at end of file
+def __dir__() -> List[str]:
+    return sorted(list(globals()) + __all__)
\ No newline at end of file
@@ -3,11 +3,7 @@
 import click
 import logging
 from pathlib import Path
-from typing import Optional
-
-from .config import Config, OutputConfig, IntroOutroConfig, ProcessingConfig
-from .splitter import Splitter
-from .utils import parse_time_string
+from typing import Any, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +54,17 @@ logger = logging.getLogger(__name__)
     default=4,
     help='Number of threads for processing'
 )
+@click.option(
+    '--reencode',
+    is_flag=True,
+    help='Re-encode segments instead of stream-copying them (slower)'
+)
+@click.option(
+    '--hwaccel',
+    type=click.Choice(['auto', 'nvenc', 'qsv', 'vaapi', 'videotoolbox', 'none']),
+    default='none',
+    help='Hardware encoder to use when re-encoding'
+)
 @click.option(
     '-c', '--config',
     type=click.Path(exists=True, path_type=Path),
@@ -83,6 +90,8 @@ def main(
     naming_pattern: str,
     quality: str,
     threads: int,
+    reencode: bool,
+    hwaccel: str,
     config: Optional[Path],
     save_config: Optional[Path],
     verbose: bool
@@ -102,6 +111,10 @@ def main(
     if verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
+    # Imported here rather than at module level so that --help stays fast
+    from .config import Config, OutputConfig, IntroOutroConfig, ProcessingConfig
+    from .utils import parse_time_string
+    
     try:
         # Load configuration
         if config:
@@ -116,31 +129,43 @@ def main(
             # Build configuration from CLI arguments
             max_length_seconds = parse_time_string(max_length)
             
-            cfg = Config(
+            def build(model: Any, **values: Any) -> Any:
+                # A saved configuration is validated when it is loaded back, so
+                # skip validation (and its side effects) when only saving it
+                return model.model_construct(**values) if save_config else model(**values)
+            
+            cfg = build(
+                Config,
                 input_path=input_file,
-                output=OutputConfig(
+                output=build(
+                    OutputConfig,
                     directory=output_dir,
                     format=format,
                     naming_pattern=naming_pattern,
                     max_segment_length=int(max_length_seconds)
                 ),
-                intro_outro=IntroOutroConfig(
+                intro_outro=build(
+                    IntroOutroConfig,
                     intro_path=intro,
                     outro_path=outro
                 ),
-                processing=ProcessingConfig(
+                processing=build(
+                    ProcessingConfig,
                     quality=quality,
-                    threads=threads
+                    threads=threads,
+                    reencode=reencode,
+                    hwaccel=hwaccel
                 )
             )
         
-        # Save configuration if requested
+        # Save configuration and stop if requested
         if save_config:
             if save_config.suffix == '.yaml' or save_config.suffix == '.yml':
                 cfg.save_yaml(save_config)
             else:
                 cfg.save_json(save_config)
             click.echo(f"Configuration saved to: {save_config}")
+            return
         
         # Display processing information
         click.echo(f"Input file: {cfg.input_path}")
@@ -153,6 +178,7 @@ def main(
             click.echo(f"Outro: {cfg.intro_outro.outro_path}")
         
         # Create splitter and process
+        from .splitter import Splitter
         splitter = Splitter(cfg)
         output_files = splitter.process()
         
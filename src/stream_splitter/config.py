@@ -4,7 +4,6 @@ from pathlib import Path
 from typing import Optional, Dict, Any
 from pydantic import BaseModel, Field, validator
 import yaml
-import json
 
 
 class IntroOutroConfig(BaseModel):
@@ -12,7 +11,7 @@ class IntroOutroConfig(BaseModel):
     intro_path: Optional[Path] = None
     outro_path: Optional[Path] = None
 
-    @validator('intro_path', 'outro_path', pre=True)
+    @validator('intro_path', 'outro_path')
     def validate_path(cls, v):
         if v is None:
             return v
@@ -28,13 +27,8 @@ class OutputConfig(BaseModel):
     format: str = Field(default="mp4")
     naming_pattern: str = Field(default="{title}_part{index:02d}_{date}")
     max_segment_length: int = Field(default=1200, description="Maximum segment length in seconds")
+    fragmented: bool = Field(default=False, description="Write fragmented MP4 for streaming playback")
     
-    @validator('directory', pre=True)
-    def create_directory(cls, v):
-        path = Path(v)
-        path.mkdir(parents=True, exist_ok=True)
-        return path
-
     @validator('max_segment_length')
     def validate_segment_length(cls, v):
         if v < 60:
@@ -51,6 +45,9 @@ class ProcessingConfig(BaseModel):
     threads: int = Field(default=4, ge=1, le=16)
     preset: str = Field(default="medium")  # FFmpeg preset: ultrafast, fast, medium, slow
     crf: int = Field(default=23, ge=0, le=51)  # Constant Rate Factor for quality
+    reencode: bool = Field(default=False)  # Stream-copy segments unless re-encoding is requested
+    # Hardware encoder used when re-encoding: auto, nvenc, qsv, vaapi, videotoolbox or none
+    hwaccel: str = Field(default="none", pattern="^(auto|nvenc|qsv|vaapi|videotoolbox|none)$")
 
 
 class Config(BaseModel):
@@ -60,7 +57,7 @@ class Config(BaseModel):
     intro_outro: IntroOutroConfig = Field(default_factory=IntroOutroConfig)
     processing: ProcessingConfig = Field(default_factory=ProcessingConfig)
     
-    @validator('input_path', pre=True)
+    @validator('input_path')
     def validate_input(cls, v):
         path = Path(v)
         if not path.exists():
@@ -85,9 +82,7 @@ class Config(BaseModel):
     @classmethod
     def from_json(cls, config_path: Path) -> "Config":
         """Load configuration from JSON file"""
-        with open(config_path, 'r') as f:
-            data = json.load(f)
-        return cls(**data)
+        return cls.model_validate_json(Path(config_path).read_bytes())
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert configuration to dictionary"""
@@ -95,10 +90,10 @@ class Config(BaseModel):
     
     def save_yaml(self, path: Path) -> None:
         """Save configuration to YAML file"""
+        # JSON mode turns paths into plain strings that safe_load can read back
         with open(path, 'w') as f:
-            yaml.dump(self.to_dict(), f, default_flow_style=False)
+            yaml.dump(self.model_dump(mode='json'), f, default_flow_style=False)
     
     def save_json(self, path: Path) -> None:
         """Save configuration to JSON file"""
-        with open(path, 'w') as f:
-            json.dump(self.to_dict(), f, indent=2)
\ No newline at end of file
+        Path(path).write_bytes(self.model_dump_json(indent=2).encode())
\ No newline at end of file
@@ -1,24 +1,68 @@
 """Main splitter logic for processing livestream videos"""
 
+import asyncio
 import logging
+import os
+import string
+from functools import partial
 from pathlib import Path
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from tqdm import tqdm
 
 from .config import Config
 from .video_processor import VideoProcessor
-from .utils import format_duration, sanitize_filename
+from .utils import format_duration, keyframe_split_points, run_sync, sanitize_filename
 
 logger = logging.getLogger(__name__)
 
+# Placeholders available in OutputConfig.naming_pattern
+NAMING_FIELDS = {'title', 'index', 'date'}
+
+
+class _Progress:
+    """Turns FFmpeg's position and finished segments into a fraction of the job done"""
+    
+    def __init__(self, callback: Optional[Callable[[float], None]], num_segments: int, duration: float):
+        self._callback = callback
+        self._num_segments = max(1, num_segments)
+        self._duration = max(duration, 1e-6)
+        self._seconds = 0.0
+        self._segments = 0
+    
+    def position(self, seconds: float) -> None:
+        """FFmpeg has processed this many seconds of the input"""
+        self._seconds = max(self._seconds, seconds)
+        self._report()
+    
+    def segment_done(self, _segment_file: Optional[Path] = None) -> None:
+        """A segment is finished"""
+        self._segments += 1
+        self._report()
+    
+    def _report(self) -> None:
+        if self._callback:
+            fraction = max(self._seconds / self._duration, self._segments / self._num_segments)
+            self._callback(min(fraction, 1.0))
+
 
 class Splitter:
     """Main class for splitting livestream videos"""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, probe_cache_dir: Optional[Path] = None):
         self.config = config
-        self.video_processor = VideoProcessor()
+        self.config.output.directory.mkdir(parents=True, exist_ok=True)
+        # ffprobe results are cached with the output unless a shared directory is given
+        self.video_processor = VideoProcessor(
+            cache_dir=probe_cache_dir or config.output.directory,
+            fragmented=config.output.fragmented
+        )
+        # Whether intro/outro can be joined to segments without re-encoding
+        self._bookends_compatible = True
+        # Whether segments are re-encoded rather than stream-copied
+        self._reencode = config.processing.reencode
+        # Naming pattern with title and date bound, called with index=...
+        self._format_name = self._compile_naming_pattern()
         self._setup_logging()
     
     def _setup_logging(self):
@@ -35,6 +79,39 @@ class Splitter:
     
     def process(self) -> List[Path]:
         """Main processing method"""
+        return run_sync(self.process_async())
+    
+    async def process_async(self,
+                            progress_callback: Optional[Callable[[float], None]] = None) -> List[Path]:
+        """Coroutine version of :meth:`process`
+
+        Every FFmpeg run is supervised by the event loop, so several videos
+        can be processed concurrently without a thread per FFmpeg process.
+        ``progress_callback`` is called on the event loop with the fraction
+        of the work done, from 0 to 1.
+        """
+        # Probing is quick but blocking, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        num_segments, split_points, duration = await loop.run_in_executor(None, self._plan_segments)
+        progress = _Progress(progress_callback, num_segments, duration)
+        
+        has_bookends = bool(self.config.intro_outro.intro_path or self.config.intro_outro.outro_path)
+        
+        if self._reencode and has_bookends:
+            # Encode each segment with its intro/outro in one pass over the input
+            segment_files = await self._split_with_bookends(num_segments, progress)
+        elif has_bookends:
+            # Add intro/outro to each segment while the split is still running
+            segment_files = await self._split_and_add_intro_outro(num_segments, progress, split_points)
+        else:
+            # Split video into segments
+            segment_files = await self._split_with_progress(num_segments, progress, split_points)
+        
+        logger.info(f"Processing complete! Created {len(segment_files)} segments")
+        return segment_files
+    
+    def _plan_segments(self) -> Tuple[int, Optional[List[float]], float]:
+        """Probe the input and work out the segment count, cut points and duration"""
         logger.info(f"Starting to process: {self.config.input_path}")
         
         # Validate input and intro/outro compatibility
@@ -48,24 +125,29 @@ class Splitter:
         logger.info(f"Video duration: {format_duration(total_duration)}")
         logger.info(f"Will create segments of max {self.config.output.max_segment_length}s")
         
-        # Calculate number of segments
-        num_segments = int(total_duration / self.config.output.max_segment_length) + \
-                      (1 if total_duration % self.config.output.max_segment_length > 0 else 0)
-        
-        logger.info(f"Creating {num_segments} segments")
-        
-        # Generate output pattern
-        output_pattern = self._generate_output_pattern()
+        if not self._reencode and not self.video_processor.can_stream_copy(video_info, self.config.output.format):
+            logger.warning(f"{video_info['codec']} video cannot be copied into "
+                           f".{self.config.output.format} files, re-encoding instead")
+            self._reencode = True
         
-        # Split video into segments
-        segment_files = self._split_with_progress(output_pattern, num_segments)
+        # Stream copy can only cut on keyframes, so plan the cuts around them
+        split_points = None
+        if not self._reencode:
+            keyframes = self.video_processor.list_keyframes(self.config.input_path)
+            if keyframes:
+                split_points = keyframe_split_points(
+                    keyframes, self.config.output.max_segment_length, total_duration
+                )
         
-        # Add intro/outro if configured
-        if self.config.intro_outro.intro_path or self.config.intro_outro.outro_path:
-            segment_files = self._add_intro_outro_to_segments(segment_files)
+        # Calculate number of segments
+        if split_points is not None:
+            num_segments = len(split_points) + 1
+        else:
+            num_segments = int(total_duration / self.config.output.max_segment_length) + \
+                          (1 if total_duration % self.config.output.max_segment_length > 0 else 0)
         
-        logger.info(f"Processing complete! Created {len(segment_files)} segments")
-        return segment_files
+        logger.info(f"Creating {num_segments} segments")
+        return num_segments, split_points, total_duration
     
     def _validate_inputs(self) -> bool:
         """Validate all input files"""
@@ -84,93 +166,228 @@ class Splitter:
         
         # Check compatibility if intro/outro are provided
         if len(files_to_check) > 1:
-            if not self.video_processor.validate_compatibility(*files_to_check):
-                logger.error("Video files are not compatible for concatenation")
-                return False
+            # Bookends are joined to segments, which are already in the output format
+            self._bookends_compatible = self.video_processor.validate_compatibility(
+                *files_to_check, output_format=self.config.output.format
+            )
+            if not self._bookends_compatible:
+                logger.warning("Intro/outro are not compatible for stream copy, "
+                               "they will be re-encoded with each segment")
         
         return True
     
-    def _generate_output_pattern(self) -> str:
-        """Generate output filename pattern"""
+    def _compile_naming_pattern(self) -> Callable[..., str]:
+        """Validate the naming pattern and bind the values fixed for this run"""
+        pattern = self.config.output.naming_pattern
+        
+        fields = {field for _, field, _, _ in string.Formatter().parse(pattern) if field is not None}
+        unknown = fields - NAMING_FIELDS
+        if unknown:
+            raise ValueError(
+                f"Unknown placeholder(s) in naming pattern: {', '.join(sorted(unknown))}. "
+                f"Supported: {', '.join(sorted(NAMING_FIELDS))}"
+            )
+        
         # Extract base name from input file
-        base_name = self.config.input_path.stem
-        base_name = sanitize_filename(base_name)
+        base_name = sanitize_filename(self.config.input_path.stem)
         
         # Get current date
         date_str = datetime.now().strftime("%Y%m%d")
         
-        # Build pattern with placeholder for index  
-        # Replace the formatting directive temporarily
-        temp_pattern = self.config.output.naming_pattern.replace("{index:02d}", "INDEXPLACEHOLDER")
-        pattern = temp_pattern.format(
-            title=base_name,
-            date=date_str
-        )
-        # Put back the index placeholder for later use
-        pattern = pattern.replace("INDEXPLACEHOLDER", "{index:02d}")
-        
-        # Add extension
-        pattern = str(self.config.output.directory / f"{pattern}.{self.config.output.format}")
-        
-        return pattern
+        return partial(pattern.format, title=base_name, date=date_str)
+    
+    def _segment_path(self, index: int) -> Path:
+        """Output path of the segment with the given 1-based index"""
+        filename = f"{self._format_name(index=index)}.{self.config.output.format}"
+        return self.config.output.directory / filename
     
-    def _split_with_progress(self, output_pattern: str, num_segments: int) -> List[Path]:
+    async def _split_with_progress(self,
+                                   num_segments: int,
+                                   progress: _Progress,
+                                   split_points: Optional[List[float]] = None) -> List[Path]:
         """Split video with progress bar"""
         segment_files = []
         
-        quality_settings = {
-            'codec': self.config.processing.codec,
-            'preset': self.config.processing.preset,
-            'crf': self.config.processing.crf,
-            'threads': self.config.processing.threads
-        }
+        if self._reencode:
+            quality_settings = self._get_quality_settings()
+        else:
+            # Stream copy: cut the container without touching the encoded frames
+            quality_settings = {'copy': True}
         
         with tqdm(total=num_segments, desc="Splitting video", unit="segment") as pbar:
+            
+            def segment_ready(segment_file: Path) -> None:
+                pbar.update(1)
+                progress.segment_done(segment_file)
+            
             try:
-                segment_files = self.video_processor.split_video(
+                segment_files = await self.video_processor.split_video_async(
                     self.config.input_path,
-                    output_pattern,
+                    self._segment_path,
                     self.config.output.max_segment_length,
-                    quality_settings
+                    quality_settings,
+                    progress_callback=segment_ready,
+                    split_points=split_points,
+                    time_callback=progress.position
+                )
+            except Exception as e:
+                logger.error(f"Error during splitting: {e}")
+                raise
+        
+        return segment_files
+    
+    async def _split_with_bookends(self, num_segments: int, progress: _Progress) -> List[Path]:
+        """Split, add intro/outro and re-encode in a single ffmpeg run with progress bar"""
+        with tqdm(total=num_segments, desc="Splitting video with intro/outro", unit="segment") as pbar:
+            try:
+                segment_files = await self.video_processor.split_with_bookends_async(
+                    self.config.input_path,
+                    self._segment_path,
+                    self.config.output.max_segment_length,
+                    self.config.intro_outro.intro_path,
+                    self.config.intro_outro.outro_path,
+                    self._get_quality_settings()
                 )
                 pbar.update(num_segments)
+                for segment_file in segment_files:
+                    progress.segment_done(segment_file)
             except Exception as e:
                 logger.error(f"Error during splitting: {e}")
                 raise
         
         return segment_files
     
-    def _add_intro_outro_to_segments(self, segment_files: List[Path]) -> List[Path]:
-        """Add intro and outro to each segment"""
-        processed_files = []
-        
-        with tqdm(total=len(segment_files), desc="Adding intro/outro", unit="file") as pbar:
-            for i, segment_file in enumerate(segment_files):
-                try:
-                    # Generate output filename
-                    output_file = segment_file.parent / f"final_{segment_file.name}"
-                    
-                    # Add intro/outro
-                    processed_file = self.video_processor.add_intro_outro(
-                        segment_file,
-                        self.config.intro_outro.intro_path,
-                        self.config.intro_outro.outro_path,
-                        output_file
+    def _get_quality_settings(self) -> Dict:
+        """Encoder settings used whenever video has to be re-encoded"""
+        return {
+            'codec': self.config.processing.codec,
+            'preset': self.config.processing.preset,
+            'crf': self.config.processing.crf,
+            'threads': self.config.processing.threads,
+            'hwaccel': self.config.processing.hwaccel
+        }
+    
+    def _intro_outro_workers(self, quality_settings: Optional[Dict]) -> int:
+        """Number of segments to join with intro/outro concurrently"""
+        if quality_settings is None:
+            # Stream copy is I/O bound, cheap on CPU
+            return self.config.processing.threads
+        if self.video_processor.resolve_hwaccel(quality_settings, filtered=True):
+            # The GPU encoder is the bottleneck, more jobs only contend for it
+            return 1
+        # Each encode already uses `threads` cores
+        return max(1, (os.cpu_count() or 1) // self.config.processing.threads)
+    
+    async def _split_and_add_intro_outro(self,
+                                         num_segments: int,
+                                         progress: _Progress,
+                                         split_points: Optional[List[float]] = None) -> List[Path]:
+        """Stream-copy split feeding finished segments straight to intro/outro workers"""
+        # Compatible files are joined with a stream copy, otherwise re-encode
+        quality_settings = None if self._bookends_compatible else self._get_quality_settings()
+        queue: asyncio.Queue = asyncio.Queue()
+        processed_files: Dict[Path, Path] = {}
+        
+        with tqdm(total=num_segments, desc="Splitting video", unit="segment", position=0) as split_bar, \
+                tqdm(total=num_segments, desc="Adding intro/outro", unit="file", position=1) as join_bar:
+            
+            def segment_ready(segment_file: Path) -> None:
+                split_bar.update(1)
+                queue.put_nowait(segment_file)
+            
+            async def worker() -> None:
+                while True:
+                    segment_file = await queue.get()
+                    if segment_file is None:
+                        return
+                    processed_files[segment_file] = await self._add_intro_outro_to_segment(
+                        segment_file, quality_settings
                     )
-                    
-                    processed_files.append(processed_file)
-                    
-                    # Remove original segment file to save space
-                    segment_file.unlink()
-                    
-                    pbar.update(1)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing segment {i+1}: {e}")
-                    # Keep the original file if processing fails
-                    processed_files.append(segment_file)
-        
-        return processed_files
+                    join_bar.update(1)
+                    progress.segment_done(segment_file)
+            
+            workers = [
+                asyncio.ensure_future(worker())
+                for _ in range(self._intro_outro_workers(quality_settings))
+            ]
+            try:
+                segment_files = await self.video_processor.split_video_async(
+                    self.config.input_path,
+                    self._segment_path,
+                    self.config.output.max_segment_length,
+                    {'copy': True},
+                    progress_callback=segment_ready,
+                    split_points=split_points,
+                    time_callback=progress.position
+                )
+            except Exception as e:
+                logger.error(f"Error during splitting: {e}")
+                for task in workers:
+                    task.cancel()
+                raise
+            finally:
+                # One stop marker per worker, queued behind the remaining segments
+                for _ in workers:
+                    queue.put_nowait(None)
+                await asyncio.gather(*workers, return_exceptions=True)
+        
+        return [processed_files.get(segment_file, segment_file) for segment_file in segment_files]
+    
+    async def _add_intro_outro_to_segment(self,
+                                          segment_file: Path,
+                                          quality_settings: Optional[Dict]) -> Path:
+        """Add intro and outro to one segment, replacing it in place
+
+        The joined video is written next to the segment and then renamed over
+        it, so an interrupted run never leaves half-written or duplicate files.
+        The original segment is kept if processing fails.
+        """
+        # Keep the extension last so FFmpeg still picks the right muxer
+        temp_file = segment_file.with_name(f".{segment_file.stem}.tmp{segment_file.suffix}")
+        try:
+            # Add intro/outro
+            await self.video_processor.add_intro_outro_async(
+                segment_file,
+                self.config.intro_outro.intro_path,
+                self.config.intro_outro.outro_path,
+                temp_file,
+                quality_settings=quality_settings
+            )
+            
+            os.replace(temp_file, segment_file)
+            return segment_file
+        
+        except Exception as e:
+            # Keep the original file if processing fails
+            logger.error(f"Error processing segment {segment_file.name}: {e}")
+            if temp_file.exists():
+                temp_file.unlink()
+            return segment_file
+    
+    def thumbnail_path(self, segment_file: Path) -> Path:
+        """Where the thumbnail of a segment is stored"""
+        return self.config.output.directory / "thumbnails" / f"{segment_file.stem}.jpg"
+    
+    def generate_thumbnails(self, segment_files: List[Path]) -> List[Path]:
+        """Save a preview image of each segment, returning an empty list on failure"""
+        if not segment_files:
+            return []
+        
+        try:
+            images = self.video_processor.create_thumbnails(segment_files)
+        except Exception as e:
+            logger.error(f"Error generating thumbnails: {e}")
+            return []
+        
+        thumbnails = []
+        for segment_file, image in zip(segment_files, images):
+            thumbnail = self.thumbnail_path(segment_file)
+            thumbnail.parent.mkdir(exist_ok=True)
+            thumbnail.write_bytes(image)
+            thumbnails.append(thumbnail)
+        
+        logger.info(f"Generated {len(thumbnails)} thumbnails")
+        return thumbnails
     
     def generate_report(self, output_files: List[Path]) -> Path:
         """Generate a processing report"""
@@ -1,18 +1,39 @@
 """Utility functions for the livestream splitter"""
 
+import asyncio
+import functools
 import re
+import shutil
+import subprocess
+import time
 import unicodedata
-from datetime import timedelta
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Coroutine, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+# Scene detection samples downscaled grayscale frames at this rate
+SCENE_SAMPLE_FPS = 2
+SCENE_FRAME_SIZE = (64, 36)
+# Mean absolute pixel difference (0-255) between samples that marks a cut
+SCENE_THRESHOLD = 30.0
+
+# Windows invalid characters: < > : " / \ | ? * and whitespace
+_SAFE_TRANSLATE = str.maketrans({c: '_' for c in '<>:"/\\|?* \t\r\n\f\v'})
+
+# Units accepted by parse_time_string, in seconds
+_TIME_UNIT_RE = re.compile(r'(\d+)\s*([hms])')
+_TIME_UNITS = {'h': 3600, 'm': 60, 's': 1}
 
 
 def format_duration(seconds: float) -> str:
     """Format duration in seconds to human-readable string"""
-    td = timedelta(seconds=seconds)
-    hours = td.seconds // 3600
-    minutes = (td.seconds % 3600) // 60
-    seconds = td.seconds % 60
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
     
     if hours > 0:
         return f"{hours}h {minutes}m {seconds}s"
@@ -33,24 +54,16 @@ def sanitize_filename(filename: str, max_length: int = 100) -> str:
     Returns:
         Sanitized filename
     """
-    # Remove or replace invalid characters
-    # Windows invalid characters: < > : " / \ | ? *
-    invalid_chars = r'[<>:"/\\|?*]'
-    filename = re.sub(invalid_chars, '_', filename)
-    
     # Remove Unicode characters that might cause issues
-    filename = unicodedata.normalize('NFKD', filename)
-    filename = filename.encode('ascii', 'ignore').decode('ascii')
-    
-    # Remove leading/trailing dots and spaces
-    filename = filename.strip('. ')
+    if not filename.isascii():
+        filename = unicodedata.normalize('NFKD', filename)
+        filename = filename.encode('ascii', 'ignore').decode('ascii')
     
-    # Replace multiple spaces or underscores with single underscore
-    filename = re.sub(r'[\s_]+', '_', filename)
+    # Remove leading/trailing dots and whitespace
+    filename = filename.strip().strip('. ')
     
-    # Ensure filename is not empty
-    if not filename:
-        filename = "unnamed"
+    # Replace invalid characters and whitespace in a single pass
+    filename = filename.translate(_SAFE_TRANSLATE) or "unnamed"
     
     # Truncate to max length
     if len(filename) > max_length:
@@ -75,11 +88,11 @@ def estimate_file_size(duration: float, bitrate: int) -> int:
 
 def human_readable_size(size_bytes: int) -> str:
     """Convert bytes to human-readable format"""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.1f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.1f} PB"
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
+    # Each unit is 2**10 times the previous one
+    index = min(len(SIZE_UNITS) - 1, (int(size_bytes).bit_length() - 1) // 10)
+    return f"{size_bytes / (1 << (index * 10)):.1f} {SIZE_UNITS[index]}"
 
 
 def check_disk_space(path: Path, required_bytes: int) -> bool:
@@ -93,15 +106,57 @@ def check_disk_space(path: Path, required_bytes: int) -> bool:
     Returns:
         True if there's enough space, False otherwise
     """
-    import shutil
-    stat = shutil.disk_usage(path)
-    return stat.free > required_bytes
+    return _disk_free(str(Path(path).resolve()), int(time.monotonic())) > required_bytes
 
 
-def find_natural_split_points(video_path: Path, target_duration: int) -> list:
+@functools.lru_cache(maxsize=16)
+def _disk_free(path: str, timestamp: int) -> int:
+    """Free bytes on the filesystem of ``path``, cached for the given second"""
+    return shutil.disk_usage(path).free
+
+
+@functools.lru_cache(maxsize=None)
+def _scene_scorer() -> Optional[Tuple[Any, Callable[[Any], Any]]]:
+    """numpy and the frame difference function, imported on first use
+
+    numpy and numba are slow to import and only needed for scene detection,
+    so they are not loaded with the module. Returns None without numpy.
     """
-    Find natural split points in a video (scene changes, silence)
-    This is a placeholder for future implementation
+    try:
+        import numpy as np
+    except ImportError:  # Optional: scene detection in find_natural_split_points
+        return None
+    
+    def frame_diff_scores(frames: Any) -> Any:
+        """Mean absolute difference between each frame and the one before it"""
+        diffs = np.abs(np.diff(frames.astype(np.int16), axis=0))
+        return np.concatenate(([0.0], diffs.mean(axis=(1, 2))))
+    
+    try:
+        from numba import njit, prange
+    except ImportError:  # Optional: JIT-compiled scene detection
+        return np, frame_diff_scores
+    
+    @njit(cache=True, parallel=True)
+    def frame_diff_scores_jit(frames: Any) -> Any:
+        """Compiled version of frame_diff_scores"""
+        scores = np.zeros(frames.shape[0])
+        for i in prange(1, frames.shape[0]):
+            scores[i] = np.mean(np.abs(frames[i].astype(np.int16) - frames[i - 1].astype(np.int16)))
+        return scores
+    
+    return np, frame_diff_scores_jit
+
+
+def find_natural_split_points(video_path: Path, target_duration: int) -> List[float]:
+    """
+    Find natural split points in a video (scene changes)
+    
+    Frames are sampled at a low rate and size, and scene changes are found
+    wherever consecutive samples differ strongly. Like keyframe cuts, the last
+    scene change within ``target_duration`` of the previous split is picked.
+    Requires numpy (and uses numba when installed); returns an empty list
+    otherwise.
     
     Args:
         video_path: Path to the video file
@@ -110,9 +165,65 @@ def find_natural_split_points(video_path: Path, target_duration: int) -> list:
     Returns:
         List of timestamps for natural split points
     """
-    # TODO: Implement scene detection using OpenCV or similar
-    # For now, return empty list to use fixed intervals
-    return []
+    scorer = _scene_scorer()
+    if scorer is None:
+        # Without numpy, use fixed intervals
+        return []
+    np, frame_diff_scores = scorer
+    
+    width, height = SCENE_FRAME_SIZE
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-v', 'error', '-i', str(video_path),
+             '-vf', f'fps={SCENE_SAMPLE_FPS},scale={width}:{height}',
+             '-pix_fmt', 'gray', '-f', 'rawvideo', '-'],
+            stdin=subprocess.DEVNULL, capture_output=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    
+    frame_bytes = width * height
+    usable = len(result.stdout) // frame_bytes * frame_bytes
+    frames = np.frombuffer(result.stdout[:usable], dtype=np.uint8).reshape(-1, height, width)
+    if len(frames) < 2:
+        return []
+    
+    scores = frame_diff_scores(frames)
+    scene_changes = [float(i) / SCENE_SAMPLE_FPS for i in np.flatnonzero(scores > SCENE_THRESHOLD)]
+    return keyframe_split_points(scene_changes, target_duration, len(frames) / SCENE_SAMPLE_FPS)
+
+
+def keyframe_split_points(keyframes: List[float],
+                          max_segment_length: float,
+                          total_duration: float) -> List[float]:
+    """
+    Choose cut points on keyframes so that no segment exceeds the maximum length
+    
+    Each cut is placed on the last keyframe at or before ``max_segment_length``
+    seconds after the previous cut. If a GOP is longer than the maximum length,
+    the next keyframe is used instead so the split can still progress.
+    
+    Args:
+        keyframes: Sorted keyframe timestamps in seconds
+        max_segment_length: Maximum segment length in seconds
+        total_duration: Duration of the video in seconds
+    
+    Returns:
+        List of cut timestamps (the start of every segment after the first)
+    """
+    split_points = []
+    previous = 0.0
+    
+    while keyframes and total_duration - previous > max_segment_length:
+        index = bisect_right(keyframes, previous + max_segment_length) - 1
+        if index < 0 or keyframes[index] <= previous:
+            index = bisect_right(keyframes, previous)
+        if index >= len(keyframes):
+            break
+        previous = keyframes[index]
+        split_points.append(previous)
+    
+    return split_points
 
 
 def parse_time_string(time_str: str) -> float:
@@ -138,21 +249,8 @@ def parse_time_string(time_str: str) -> float:
     
     # Try format with units
     total_seconds = 0
-    
-    # Hours
-    hours_match = re.search(r'(\d+)\s*h', time_str)
-    if hours_match:
-        total_seconds += int(hours_match.group(1)) * 3600
-    
-    # Minutes
-    minutes_match = re.search(r'(\d+)\s*m', time_str)
-    if minutes_match:
-        total_seconds += int(minutes_match.group(1)) * 60
-    
-    # Seconds
-    seconds_match = re.search(r'(\d+)\s*s', time_str)
-    if seconds_match:
-        total_seconds += int(seconds_match.group(1))
+    for match in _TIME_UNIT_RE.finditer(time_str):
+        total_seconds += int(match.group(1)) * _TIME_UNITS[match.group(2)]
     
     if total_seconds > 0:
         return total_seconds
@@ -177,6 +275,25 @@ def parse_time_string(time_str: str) -> float:
     raise ValueError(f"Unable to parse time string: {time_str}")
 
 
+def read_file_headers(paths: List[Path], nbytes: int = 4096) -> List[bytes]:
+    """
+    Read the first bytes of several files concurrently
+    
+    Args:
+        paths: Files to read
+        nbytes: Number of bytes to read from the start of each file
+    
+    Returns:
+        The header of each file, in the order of ``paths``
+    """
+    def read_header(path: Path) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read(nbytes)
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(paths)))) as executor:
+        return list(executor.map(read_header, paths))
+
+
 def create_progress_callback(progress_bar):
     """
     Create a progress callback function for FFmpeg
@@ -192,4 +309,27 @@ def create_progress_callback(progress_bar):
             # Update progress based on time processed
             progress_bar.update(1)
     
-    return callback
\ No newline at end of file
+    return callback
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine to completion from synchronous code
+    
+    Works even when the calling thread is already running an event loop
+    (e.g. a sync call made from an async web handler) by running the
+    coroutine on a fresh loop in a helper thread.
+    
+    Args:
+        coro: Coroutine to run
+    
+    Returns:
+        The coroutine's result
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
\ No newline at end of file
@@ -1,19 +1,375 @@
 """FFmpeg-based video processing functionality"""
 
+import asyncio
 import ffmpeg
+import functools
 import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Callable, Deque, Dict, Iterator, List, Tuple, Optional, Union
 import logging
 
+from .utils import read_file_headers, run_sync
+
+try:
+    import orjson
+except ImportError:  # Optional: faster probe cache (de)serialization
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import fcntl
+except ImportError:  # Windows: cache writes are only serialized within a process
+    fcntl = None  # type: ignore[assignment]
+
 logger = logging.getLogger(__name__)
 
+# Output extensions whose muxer name differs from the extension itself
+SEGMENT_FORMATS = {
+    'mkv': 'matroska',
+}
+
+# Muxers that support moving the index (moov atom) to the start of the file
+FASTSTART_FORMATS = {'mp4', 'mov'}
+
+# movflags for fragmented MP4, which browsers can stream through Media Source
+FRAGMENTED_MOVFLAGS = '+frag_keyframe+empty_moov+default_base_moof'
+
+# Video codecs each output container can take as-is; containers not listed
+# (such as Matroska) accept any codec
+CONTAINER_CODECS = {
+    'mp4': {'h264', 'hevc', 'av1', 'vp9', 'mpeg4'},
+    'mov': {'h264', 'hevc', 'prores', 'mpeg4', 'mjpeg'},
+    'avi': {'h264', 'mpeg4', 'mjpeg'},
+    'flv': {'h264'},
+    'webm': {'vp8', 'vp9', 'av1'},
+}
+
+# ffprobe results (video info, keyframes) are cached per input file here
+PROBE_CACHE_NAME = ".probe_cache.json"
+
+# ffprobe fields read by get_video_info
+PROBE_ENTRIES = ('stream=width,height,codec_name,r_frame_rate,bit_rate,duration'
+                 ':format=duration,format_name')
+
+# ffprobe results shared in memory by all VideoProcessor instances, the
+# least recently used files are evicted beyond PROBE_MEMO_SIZE
+PROBE_MEMO_SIZE = 256
+_PROBE_MEMO: 'OrderedDict[str, Dict]' = OrderedDict()
+_PROBE_MEMO_LOCK = threading.Lock()
+
+# Held while a probe cache file is read, merged and rewritten
+_PROBE_CACHE_WRITE_LOCK = threading.Lock()
+
+# Codec names accepted in the configuration, mapped to their codec family
+CODEC_FAMILIES = {
+    'h264': 'h264',
+    'libx264': 'h264',
+    'hevc': 'hevc',
+    'h265': 'hevc',
+    'libx265': 'hevc',
+}
+
+# Hardware encoders per backend and codec family, in 'auto' preference order
+HW_ENCODERS = {
+    'nvenc': {'h264': 'h264_nvenc', 'hevc': 'hevc_nvenc'},
+    'qsv': {'h264': 'h264_qsv', 'hevc': 'hevc_qsv'},
+    'videotoolbox': {'h264': 'h264_videotoolbox', 'hevc': 'hevc_videotoolbox'},
+    'vaapi': {'h264': 'h264_vaapi', 'hevc': 'hevc_vaapi'},
+}
+
+# Input options that keep decoding (and frames) on the same device as the encoder
+HW_DECODE_ARGS = {
+    'nvenc': {'hwaccel': 'cuda', 'hwaccel_output_format': 'cuda'},
+    'qsv': {'hwaccel': 'qsv', 'hwaccel_output_format': 'qsv'},
+    'videotoolbox': {'hwaccel': 'videotoolbox'},
+    'vaapi': {
+        'hwaccel': 'vaapi',
+        'hwaccel_output_format': 'vaapi',
+        'vaapi_device': '/dev/dri/renderD128',
+    },
+}
+
+# Rate control per backend: option name and conversion from the configured CRF
+HW_QUALITY = {
+    'nvenc': ('cq', lambda crf: crf),
+    'qsv': ('global_quality', lambda crf: crf),
+    'videotoolbox': ('q:v', lambda crf: max(1, min(100, 100 - 2 * crf))),
+    'vaapi': ('qp', lambda crf: crf),
+}
+
+# Extra encoder options per backend
+HW_ENCODER_ARGS = {
+    'nvenc': {'preset': 'p4', 'rc': 'vbr'},
+    'qsv': {'preset': 'medium'},
+    'videotoolbox': {},
+    'vaapi': {},
+}
+
+# Signatures at the start of container files, used to tell containers apart
+# without running ffprobe: ((offset, magic bytes), ...) all matching, container
+CONTAINER_MAGIC = [
+    (((4, b'ftyp'),), 'mp4'),
+    # Older QuickTime files start straight with a top-level atom
+    (((4, b'moov'),), 'mp4'),
+    (((4, b'mdat'),), 'mp4'),
+    (((4, b'wide'),), 'mp4'),
+    (((0, b'\x1a\x45\xdf\xa3'),), 'matroska'),
+    # RIFF alone is also WAV, WebP...
+    (((0, b'RIFF'), (8, b'AVI ')), 'avi'),
+    (((0, b'FLV\x01'),), 'flv'),
+    # A 0x47 sync byte at the start of two consecutive 188-byte packets
+    (((0, b'\x47'), (188, b'\x47')), 'mpegts'),
+]
+
+# Container detect_container reports for files with each output extension
+EXTENSION_CONTAINERS = {
+    'mp4': 'mp4', 'mov': 'mp4', 'm4v': 'mp4',
+    'mkv': 'matroska', 'webm': 'matroska',
+    'avi': 'avi', 'flv': 'flv', 'ts': 'mpegts',
+}
+
+# Bytes read from each file to match CONTAINER_MAGIC, up to the second TS sync byte
+CONTAINER_HEADER_SIZE = 189
+
+# Videos opened by one FFmpeg run when extracting thumbnails
+THUMBNAIL_BATCH_SIZE = 32
+
+# Lines of FFmpeg's log kept to report errors
+STDERR_TAIL_LINES = 50
+
+# Logged by the segment muxer each time it starts writing a new file
+SEGMENT_OPENING_RE = re.compile(r"\[segment @ [^\]]+\] Opening '(.+)' for writing")
+
+# Keys of `-progress` reports holding the output position, both in microseconds
+# (out_time_ms is misnamed; older FFmpeg versions only write that one)
+PROGRESS_TIME_KEYS = (b'out_time_us', b'out_time_ms')
+
+
+# Either a filename pattern containing "{index:02d}" or a function mapping a
+# 1-based segment index to its output path
+OutputPattern = Union[str, Callable[[int], Path]]
+
+
+def _segment_namer(output_pattern: OutputPattern) -> Callable[[int], Path]:
+    """Normalize an output pattern into a function from segment index to path"""
+    if callable(output_pattern):
+        return output_pattern
+    # Turn the placeholder into printf-style once instead of on every call
+    template = output_pattern.replace('%', '%%').replace("{index:02d}", "%02d")
+    placeholders = output_pattern.count("{index:02d}")
+    return lambda index: Path(template % ((index,) * placeholders))
+
+
+def detect_container(header: bytes) -> Optional[str]:
+    """Identify a container from the first bytes of a file, or None if unknown"""
+    for signature, container in CONTAINER_MAGIC:
+        if all(header[offset:offset + len(magic)] == magic for offset, magic in signature):
+            return container
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def _resolved_path(path: Path) -> str:
+    """Resolved absolute path as a string, looked up once per path per process"""
+    return str(path.resolve())
+
+
+def _existing_files(paths: List[Path]) -> set:
+    """Subset of ``paths`` that exist, listing a shared parent directory only once"""
+    parents = {path.parent for path in paths}
+    if len(paths) < 2 or len(parents) > 1:
+        return {path for path in paths if path.exists()}
+    try:
+        with os.scandir(parents.pop()) as entries:
+            names = {entry.name for entry in entries}
+    except OSError:
+        return set()
+    return {path for path in paths if path.name in names}
+
+
+@functools.lru_cache(maxsize=None)
+def _available_encoders() -> frozenset:
+    """Names of the encoders compiled into the local FFmpeg build"""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Could not list FFmpeg encoders: {e}")
+        return frozenset()
+    
+    encoders = set()
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        # Encoder lines look like " V....D h264_nvenc  NVIDIA NVENC H.264 encoder"
+        if len(fields) >= 2 and len(fields[0]) == 6:
+            encoders.add(fields[1])
+    return frozenset(encoders)
+
+
+def _resolve_hwaccel(quality_settings: Dict, filtered: bool = False) -> Optional[str]:
+    """Pick the hardware encoder backend to use, or None for CPU encoding"""
+    requested = quality_settings.get('hwaccel', 'none')
+    if requested == 'none':
+        return None
+    
+    family = CODEC_FAMILIES.get(quality_settings.get('codec', 'h264'))
+    candidates = list(HW_ENCODERS) if requested == 'auto' else [requested]
+    available = _available_encoders()
+    
+    for backend in candidates:
+        if filtered and backend == 'vaapi':
+            continue
+        if family is not None and HW_ENCODERS[backend].get(family) in available:
+            return backend
+    
+    if requested == 'vaapi' and filtered:
+        logger.warning("VAAPI cannot encode filter graph output, encoding on CPU")
+    elif requested != 'auto':
+        logger.warning(f"Hardware encoder '{requested}' is not available, encoding on CPU")
+    return None
+
+
+def _decode_args(quality_settings: Dict) -> Dict:
+    """FFmpeg input arguments matching the hardware encoder, if any"""
+    backend = _resolve_hwaccel(quality_settings)
+    return dict(HW_DECODE_ARGS[backend]) if backend else {}
+
+
+def _encode_args(quality_settings: Dict, filtered: bool = False) -> Dict:
+    """FFmpeg output arguments for re-encoding with the given quality settings"""
+    crf = quality_settings.get('crf', 23)
+    audio_args = {'c:a': 'aac', 'b:a': '192k'}  # Audio settings
+    
+    backend = _resolve_hwaccel(quality_settings, filtered)
+    if backend:
+        family = CODEC_FAMILIES[quality_settings.get('codec', 'h264')]
+        quality_option, to_quality = HW_QUALITY[backend]
+        return {
+            'c:v': HW_ENCODERS[backend][family],
+            quality_option: to_quality(crf),
+            **HW_ENCODER_ARGS[backend],
+            **audio_args,
+        }
+    
+    return {
+        'vcodec': quality_settings.get('codec', 'h264'),
+        'preset': quality_settings.get('preset', 'medium'),
+        'crf': crf,
+        'threads': quality_settings.get('threads', 4),
+        **audio_args,
+    }
+
+
+def _option_argv(options: Dict) -> List[str]:
+    """Turn a dict of FFmpeg options into command line arguments"""
+    argv = []
+    for key, value in options.items():
+        argv += [f'-{key}', str(value)]
+    return argv
+
+
+@functools.lru_cache(maxsize=None)
+def _quality_argv(quality_key: Tuple) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Input and output arguments for re-encoding, built once per quality settings
+
+    ``quality_key`` is the sorted items of the quality settings dict.
+    """
+    quality_settings = dict(quality_key)
+    return (tuple(_option_argv(_decode_args(quality_settings))),
+            tuple(_option_argv(_encode_args(quality_settings))))
+
+
+def _split_jpegs(data: bytes) -> List[bytes]:
+    """Split concatenated JPEG images (as written by image2pipe) at their SOI/EOI markers"""
+    images = []
+    start = data.find(b'\xff\xd8')
+    while start != -1:
+        end = data.find(b'\xff\xd9', start + 2)
+        if end == -1:
+            break
+        images.append(data[start:end + 2])
+        start = data.find(b'\xff\xd8', end + 2)
+    return images
+
+
+async def _read_progress(stream: asyncio.StreamReader, time_callback: Callable[[float], None]) -> None:
+    """Report the output position, in seconds, from FFmpeg's ``-progress`` stream"""
+    async for line in stream:
+        key, _, value = line.rstrip().partition(b'=')
+        # Before the first frame is written the position is N/A or negative
+        if key in PROGRESS_TIME_KEYS and value.isdigit():
+            time_callback(int(value) / 1_000_000)
+
+
+@contextmanager
+def _probe_cache_locked(cache_file: Path) -> Iterator[None]:
+    """Serialize updates of a probe cache file between threads and processes"""
+    with _PROBE_CACHE_WRITE_LOCK:
+        if fcntl is None:
+            yield
+            return
+        with open(cache_file.with_name(cache_file.name + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _probe_cache_path(key: str) -> str:
+    """File path of a probe cache key ("path|size|mtime")"""
+    return key.rsplit('|', 2)[0]
+
+
+def _parse_keyframes(output: str) -> List[float]:
+    """Keyframe offsets from ffprobe's packet and format CSV sections"""
+    keyframes = []
+    start_time = 0.0
+    for line in output.splitlines():
+        section, _, fields = line.partition(',')
+        if section == 'packet':
+            pts_time, _, flags = fields.partition(',')
+            if flags.startswith('K') and pts_time not in ('', 'N/A'):
+                keyframes.append(float(pts_time))
+        elif section == 'format' and fields not in ('', 'N/A'):
+            start_time = float(fields)
+    keyframes.sort()
+    return [t - start_time for t in keyframes]
+
+
+def _run_ffmpeg(argv: List[str]) -> None:
+    """Run an FFmpeg command line, raising ffmpeg.Error if it fails
+
+    Only the last STDERR_TAIL_LINES lines of FFmpeg's log are kept for the
+    error, so long encodes don't accumulate their whole log in memory.
+    """
+    stderr_tail: Deque[bytes] = deque(maxlen=STDERR_TAIL_LINES)
+    with subprocess.Popen([argv[0], '-nostats', *argv[1:]], stdin=subprocess.DEVNULL,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) as process:
+        assert process.stderr is not None
+        for line in process.stderr:
+            stderr_tail.append(line)
+    if process.returncode != 0:
+        raise ffmpeg.Error('ffmpeg', b'', b''.join(stderr_tail))
+
 
 class VideoProcessor:
     """Handles video processing operations using FFmpeg"""
     
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[Path] = None, fragmented: bool = False):
         self.ffmpeg_path = self._find_ffmpeg()
+        self.cache_dir = cache_dir
+        # Write MP4/MOV outputs as fragmented files instead of faststart ones
+        self.fragmented = fragmented
+        self._probe_cache: Optional[Dict[str, Dict]] = None
+        self._probe_cache_lock = threading.Lock()
     
     def _find_ffmpeg(self) -> Optional[str]:
         """Find FFmpeg executable"""
@@ -28,20 +384,126 @@ class VideoProcessor:
             logger.warning("FFmpeg not found in PATH")
             return None
     
+    def _probe_cache_file(self) -> Optional[Path]:
+        return self.cache_dir / PROBE_CACHE_NAME if self.cache_dir else None
+
+    def _cached_probe(self, input_path: Path, kind: str, compute: Callable[[], object]) -> Any:
+        """Return a cached ffprobe result for ``input_path``, computing it on a miss
+
+        Entries are keyed by resolved path, size and mtime so that a modified
+        file is probed again. Results are shared in memory by every instance in
+        the process, and persisted in ``cache_dir`` across runs.
+        """
+        stat = input_path.stat()
+        key = f"{_resolved_path(input_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        
+        with _PROBE_MEMO_LOCK:
+            entry = _PROBE_MEMO.get(key, {})
+            if kind in entry:
+                _PROBE_MEMO.move_to_end(key)
+                return entry[kind]
+        
+        with self._probe_cache_lock:
+            if self._probe_cache is None:
+                self._probe_cache = self._load_probe_cache()
+            entry = self._probe_cache.get(key, {})
+        
+        if kind in entry:
+            value = entry[kind]
+        else:
+            value = compute()
+            self._update_probe_cache(key, kind, value)
+        
+        with _PROBE_MEMO_LOCK:
+            _PROBE_MEMO.setdefault(key, {})[kind] = value
+            _PROBE_MEMO.move_to_end(key)
+            while len(_PROBE_MEMO) > PROBE_MEMO_SIZE:
+                _PROBE_MEMO.popitem(last=False)
+        return value
+
+    def _load_probe_cache(self) -> Dict[str, Dict]:
+        cache_file = self._probe_cache_file()
+        if not cache_file or not cache_file.exists():
+            return {}
+        try:
+            data = cache_file.read_bytes()
+            cache: Dict[str, Dict] = orjson.loads(data) if orjson else json.loads(data)
+            return cache
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable probe cache: {cache_file}")
+            return {}
+
+    def _update_probe_cache(self, key: Optional[str] = None, kind: Optional[str] = None,
+                            value: object = None) -> None:
+        """Save a result in the on-disk cache, merged with what other writers saved
+
+        The cache file may be shared by several jobs and server processes, so it
+        is re-read under a lock before being replaced. Entries of files that no
+        longer exist are dropped at the same time.
+        """
+        cache_file = self._probe_cache_file()
+        if not cache_file:
+            # Nothing to persist, the in-memory memo keeps the result
+            return
+        
+        try:
+            with _probe_cache_locked(cache_file):
+                cache = self._load_probe_cache()
+                if key is not None:
+                    cache.setdefault(key, {})[kind] = value
+                cache = {k: v for k, v in cache.items() if os.path.exists(_probe_cache_path(k))}
+                self._write_probe_cache(cache_file, cache)
+        except OSError as e:
+            logger.warning(f"Could not write probe cache: {e}")
+            return
+        
+        with self._probe_cache_lock:
+            self._probe_cache = cache
+
+    @staticmethod
+    def _write_probe_cache(cache_file: Path, cache: Dict[str, Dict]) -> None:
+        data = orjson.dumps(cache) if orjson else json.dumps(cache).encode()
+        # A unique temporary file, so concurrent writers never share one
+        with tempfile.NamedTemporaryFile(dir=cache_file.parent, prefix=cache_file.name,
+                                         suffix=".tmp", delete=False) as temp_file:
+            temp_file.write(data)
+        try:
+            os.replace(temp_file.name, cache_file)
+        except OSError:
+            os.unlink(temp_file.name)
+            raise
+
+    def prune_probe_cache(self) -> None:
+        """Drop cached results of files that no longer exist"""
+        self._update_probe_cache()
+
     def get_video_info(self, input_path: Path) -> Dict:
         """Extract video metadata using ffprobe"""
+        video_info: Dict = self._cached_probe(input_path, 'video_info', lambda: self._probe_video_info(input_path))
+        return video_info
+
+    def _probe_video_info(self, input_path: Path) -> Dict:
+        # Only ask for the first video stream and the fields used below;
+        # ffmpeg.probe() would always add -show_format -show_streams
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', PROBE_ENTRIES,
+            '-of', 'json',
+            str(input_path)
+        ]
         try:
-            probe = ffmpeg.probe(str(input_path))
-            
-            # Find the video stream (not audio)
-            video_stream = None
-            for stream in probe['streams']:
-                if stream['codec_type'] == 'video':
-                    video_stream = stream
-                    break
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error getting video info: {e.stderr}")
+            raise
+
+        try:
+            probe = json.loads(result.stdout)
             
-            if not video_stream:
+            if not probe.get('streams'):
                 raise ValueError("No video stream found in file")
+            video_stream = probe['streams'][0]
             
             # Get duration from format if not in video stream
             duration = float(video_stream.get('duration', probe['format']['duration']))
@@ -68,55 +530,409 @@ class VideoProcessor:
             logger.error(f"Error getting video info: {e}")
             raise
     
+    def list_keyframes(self, input_path: Path) -> List[float]:
+        """List keyframe times of the first video stream, in seconds from the start
+
+        Times are relative to the file's start time, as FFmpeg shifts output
+        timestamps to start at 0. MPEG-TS and FLV captures rarely start at 0.
+        """
+        keyframes: List[float] = self._cached_probe(
+            input_path, 'keyframe_offsets', lambda: self._probe_keyframes(input_path)
+        )
+        return keyframes
+
+    def _probe_keyframes(self, input_path: Path) -> List[float]:
+        # Reading packet flags finds keyframes without decoding any frames
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags:format=start_time',
+            '-of', 'csv',
+            str(input_path)
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error listing keyframes: {e.stderr}")
+            raise
+
+        return _parse_keyframes(result.stdout)
+
     def split_video(self, 
                    input_path: Path, 
-                   output_pattern: str,
+                   output_pattern: OutputPattern,
                    segment_duration: int,
-                   quality_settings: Dict) -> List[Path]:
-        """Split video into segments of specified duration"""
+                   quality_settings: Dict,
+                   progress_callback: Optional[Callable[[Path], None]] = None,
+                   split_points: Optional[List[float]] = None) -> List[Path]:
+        """Split video into segments of specified duration
+
+        ``progress_callback`` is called with each segment path once it is complete.
+        When stream-copying, ``split_points`` gives exact cut timestamps (ideally
+        keyframes) to use instead of cutting every ``segment_duration`` seconds.
+
+        Seeking accuracy: stream copies can only cut on keyframes, so segments
+        start at the keyframe at or before each cut. Re-encoded segments seek
+        with ``-ss`` before ``-i``, which jumps through the container index to
+        the preceding keyframe and then decodes only up to the exact start, so
+        the cuts are frame-accurate without decoding from the start of the file.
+        """
+        return run_sync(self.split_video_async(
+            input_path, output_pattern, segment_duration,
+            quality_settings, progress_callback, split_points
+        ))
+
+    async def split_video_async(self,
+                                input_path: Path,
+                                output_pattern: OutputPattern,
+                                segment_duration: int,
+                                quality_settings: Dict,
+                                progress_callback: Optional[Callable[[Path], None]] = None,
+                                split_points: Optional[List[float]] = None,
+                                time_callback: Optional[Callable[[float], None]] = None) -> List[Path]:
+        """Coroutine version of :meth:`split_video`
+
+        ``progress_callback`` runs on the event loop, so it can hand finished
+        segments to other tasks while the split is still running.
+        ``time_callback`` is called with the number of seconds of the input
+        processed so far, as reported by FFmpeg. Single-pass re-encodes write
+        every segment at once and only report through ``progress_callback``.
+        """
+        if quality_settings.get('copy'):
+            return await self._split_stream_copy(
+                input_path, output_pattern, segment_duration, progress_callback, split_points,
+                time_callback
+            )
+
         video_info = self.get_video_info(input_path)
         total_duration = video_info['duration']
         num_segments = int(total_duration / segment_duration) + (1 if total_duration % segment_duration > 0 else 0)
         
-        output_files = []
+        segment_path = _segment_namer(output_pattern)
+        output_files: List[Optional[Path]] = [None] * num_segments
         
-        for i in range(num_segments):
+        decode_argv, encode_argv = _quality_argv(tuple(sorted(quality_settings.items())))
+        
+        # Segments are independent, so encode several at once. Each ffmpeg
+        # already uses `threads` cores, and a GPU encoder is shared by all jobs.
+        if _resolve_hwaccel(quality_settings):
+            max_workers = 1
+        else:
+            max_workers = max(1, (os.cpu_count() or 1) // quality_settings.get('threads', 4))
+            if max_workers == 1:
+                # No room for parallel encodes: decode the input once and
+                # encode every segment from it in a single ffmpeg process
+                return await self._split_reencode_single_pass(
+                    input_path, [segment_path(i + 1) for i in range(num_segments)],
+                    segment_duration, encode_argv, progress_callback
+                )
+        
+        slots = asyncio.Semaphore(max_workers)
+        # Seconds encoded so far of each segment
+        encoded = [0.0] * num_segments
+        
+        async def encode_segment(i: int) -> None:
             start_time = i * segment_duration
-            # Replace {index:02d} with the actual segment number
-            segment_filename = output_pattern.replace("{index:02d}", f"{i+1:02d}")
-            output_path = Path(segment_filename)
+            output_path = segment_path(i + 1)
             
             # Build FFmpeg command
-            stream = ffmpeg.input(str(input_path), ss=start_time, t=segment_duration)
-            
-            # Apply quality settings
-            stream = ffmpeg.output(
-                stream,
-                str(output_path),
-                vcodec=quality_settings.get('codec', 'h264'),
-                preset=quality_settings.get('preset', 'medium'),
-                crf=quality_settings.get('crf', 23),
-                threads=quality_settings.get('threads', 4),
-                **{'c:a': 'aac', 'b:a': '192k'}  # Audio settings
-            )
+            # Seek on the input (fast, via the index) and limit the output duration
+            argv = ['ffmpeg', '-y', '-ss', str(start_time),
+                    *decode_argv, '-i', str(input_path),
+                    '-t', str(segment_duration), *encode_argv,
+                    '-avoid_negative_ts', 'make_zero',
+                    *_option_argv(self._mux_args(output_path)), str(output_path)]
             
             # Run FFmpeg command
-            try:
-                ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
-                output_files.append(output_path)
-                logger.info(f"Created segment: {output_path}")
-            except ffmpeg.Error as e:
-                logger.error(f"Error creating segment {i+1}: {e.stderr.decode()}")
-                raise
+            def segment_time(seconds: float) -> None:
+                encoded[i] = seconds
+                if time_callback:
+                    time_callback(sum(encoded))
+            
+            async with slots:
+                try:
+                    await self._run_async(argv, segment_time if time_callback else None)
+                except ffmpeg.Error as e:
+                    logger.error(f"Error creating segment {i+1}: {e.stderr.decode()}")
+                    raise
+            logger.info(f"Created segment: {output_path}")
+            output_files[i] = output_path
+            if progress_callback:
+                progress_callback(output_path)
         
+        # The event loop supervises every ffmpeg, no thread is tied up per encode
+        tasks = [asyncio.ensure_future(encode_segment(i)) for i in range(num_segments)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        
+        # Every segment is set once all tasks succeeded
+        return [path for path in output_files if path is not None]
+
+    async def _split_reencode_single_pass(self,
+                                          input_path: Path,
+                                          output_files: List[Path],
+                                          segment_duration: int,
+                                          encode_argv: Tuple[str, ...],
+                                          progress_callback: Optional[Callable[[Path], None]] = None) -> List[Path]:
+        """Re-encode all segments from one decode of the input, one output per segment"""
+        argv = ['ffmpeg', '-y', '-i', str(input_path)]
+        for i, output_path in enumerate(output_files):
+            # Output seeking: frames before the segment are decoded once, then dropped
+            argv += ['-ss', str(i * segment_duration), '-t', str(segment_duration),
+                     *encode_argv, '-avoid_negative_ts', 'make_zero',
+                     *_option_argv(self._mux_args(output_path)), str(output_path)]
+        
+        try:
+            await self._run_async(argv)
+        except ffmpeg.Error as e:
+            logger.error(f"Error splitting video: {e.stderr.decode()}")
+            raise
+        
+        for output_path in output_files:
+            logger.info(f"Created segment: {output_path}")
+            if progress_callback:
+                progress_callback(output_path)
         return output_files
-    
+
+    async def _split_stream_copy(self,
+                           input_path: Path,
+                           output_pattern: OutputPattern,
+                           segment_duration: int,
+                           progress_callback: Optional[Callable[[Path], None]] = None,
+                           split_points: Optional[List[float]] = None,
+                           time_callback: Optional[Callable[[float], None]] = None) -> List[Path]:
+        """Split video with the segment muxer in a single pass, without re-encoding
+
+        Each segment is renamed to its final path and reported through
+        ``progress_callback`` as soon as the muxer moves on to the next one.
+        """
+        segment_path = _segment_namer(output_pattern)
+        output_dir = segment_path(1).parent
+        extension = segment_path(1).suffix.lstrip('.').lower()
+
+        # The segment muxer only understands printf-style numbering, so write to
+        # temporary names and rename to the configured pattern afterwards
+        temp_pattern = output_dir / f".segment_%03d.{extension}"
+
+        if split_points:
+            # Cuts sit exactly on keyframes; allow half a frame so that rounding
+            # can't push one past its keyframe and on to the next GOP
+            fps = self.get_video_info(input_path)['fps'] or 30.0
+            segment_args = ['-segment_times', ','.join(f"{t:.6f}" for t in split_points),
+                            '-segment_time_delta', f"{0.5 / fps:.6f}"]
+        else:
+            segment_args = ['-segment_time', str(segment_duration)]
+
+        segment_format = SEGMENT_FORMATS.get(extension, extension)
+        mux_args = self._mux_args(temp_pattern)
+        if mux_args:
+            # Put the index first so segments can play before fully downloaded
+            segment_args += ['-segment_format_options', f"movflags={mux_args['movflags']}"]
+
+        argv = ['ffmpeg', '-nostats', '-y', '-i', str(input_path),
+                # Video and audio only: data tracks like timed ID3 in TS/HLS
+                # captures and subtitles are rejected by the MP4 muxer
+                '-map', '0:v', '-map', '0:a?', '-dn', '-sn',
+                '-c', 'copy', '-f', 'segment', '-reset_timestamps', '1',
+                '-segment_format', segment_format,
+                *segment_args, str(temp_pattern)]
+        if time_callback:
+            argv[1:1] = ['-progress', 'pipe:1']
+
+        output_files: List[Path] = []
+        current_segment: Optional[Path] = None
+
+        def segment_complete(temp_file: Path) -> None:
+            output_path = segment_path(len(output_files) + 1)
+            temp_file.replace(output_path)
+            output_files.append(output_path)
+            logger.info(f"Created segment: {output_path}")
+            if progress_callback:
+                progress_callback(output_path)
+
+        stderr_tail: Deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE if time_callback else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        async def read_log() -> None:
+            nonlocal current_segment
+            assert process.stderr is not None
+            async for raw_line in process.stderr:
+                line = raw_line.decode(errors='replace')
+                stderr_tail.append(line)
+                match = SEGMENT_OPENING_RE.search(line)
+                if not match:
+                    continue
+                # The muxer closes a segment before opening the next one
+                if current_segment:
+                    segment_complete(current_segment)
+                current_segment = Path(match.group(1))
+
+        try:
+            if time_callback:
+                assert process.stdout is not None
+                await asyncio.gather(read_log(), _read_progress(process.stdout, time_callback))
+            else:
+                await read_log()
+            await process.wait()
+        except BaseException:
+            # Cancelled, or a callback failed: stop FFmpeg writing more segments
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+
+        if process.returncode != 0:
+            stderr = ''.join(stderr_tail)
+            logger.error(f"Error splitting video: {stderr}")
+            raise ffmpeg.Error('ffmpeg', b'', stderr.encode())
+
+        if current_segment:
+            segment_complete(current_segment)
+
+        return output_files
+
+    def _mux_args(self, output_path: Path) -> Dict:
+        """Muxer options for an output file, putting the MP4/MOV index up front"""
+        extension = output_path.suffix.lstrip('.').lower()
+        if SEGMENT_FORMATS.get(extension, extension) not in FASTSTART_FORMATS:
+            return {}
+        return {'movflags': FRAGMENTED_MOVFLAGS if self.fragmented else '+faststart'}
+
+    def resolve_hwaccel(self, quality_settings: Dict, filtered: bool = False) -> Optional[str]:
+        """Pick the hardware encoder backend to use, or None for CPU encoding
+
+        ``filtered`` marks encodes fed by a software filter graph, which VAAPI
+        cannot take without an explicit upload to the GPU.
+        """
+        return _resolve_hwaccel(quality_settings, filtered)
+
+    @staticmethod
+    def _conform_video(stream: Any, video_info: Dict) -> Any:
+        """Scale, pad and retime a video stream to match ``video_info`` for concatenation"""
+        width, height = video_info['width'], video_info['height']
+        return (
+            stream
+            .filter('scale', width, height, force_original_aspect_ratio='decrease')
+            .filter('pad', width, height, '(ow-iw)/2', '(oh-ih)/2')
+            .filter('setsar', 1)
+            .filter('fps', fps=video_info['fps'])
+        )
+
+    def split_with_bookends(self,
+                            input_path: Path,
+                            output_pattern: OutputPattern,
+                            segment_duration: int,
+                            intro_path: Optional[Path],
+                            outro_path: Optional[Path],
+                            quality_settings: Dict) -> List[Path]:
+        """Split and re-encode a video with intro/outro in a single ffmpeg pass
+
+        The input is decoded once and every segment is trimmed from it, wrapped
+        with the intro/outro and encoded straight to its final file.
+        """
+        return run_sync(self.split_with_bookends_async(
+            input_path, output_pattern, segment_duration, intro_path, outro_path, quality_settings
+        ))
+
+    async def split_with_bookends_async(self,
+                                        input_path: Path,
+                                        output_pattern: OutputPattern,
+                                        segment_duration: int,
+                                        intro_path: Optional[Path],
+                                        outro_path: Optional[Path],
+                                        quality_settings: Dict) -> List[Path]:
+        """Coroutine version of :meth:`split_with_bookends`"""
+        video_info = self.get_video_info(input_path)
+        total_duration = video_info['duration']
+        num_segments = int(total_duration / segment_duration) + (1 if total_duration % segment_duration > 0 else 0)
+        segment_path = _segment_namer(output_pattern)
+
+        def branches(path: Path) -> Tuple[Any, Any]:
+            # One decoded copy of each input, fanned out to every segment
+            source = ffmpeg.input(str(path))
+            return (source.video.filter_multi_output('split', num_segments),
+                    source.audio.filter_multi_output('asplit', num_segments))
+
+        main_video, main_audio = branches(input_path)
+        intro = branches(intro_path) if intro_path else None
+        outro = branches(outro_path) if outro_path else None
+
+        output_files = [segment_path(i + 1) for i in range(num_segments)]
+        outputs = []
+        for i, output_path in enumerate(output_files):
+            start_time = i * segment_duration
+            end_time = min(start_time + segment_duration, total_duration)
+
+            parts = []
+            if intro:
+                parts.extend([self._conform_video(intro[0][i], video_info), intro[1][i]])
+            video = (
+                main_video[i]
+                .trim(start=start_time, end=end_time)
+                .setpts('PTS-STARTPTS')
+            )
+            audio = (
+                main_audio[i]
+                .filter('atrim', start=start_time, end=end_time)
+                .filter('asetpts', 'PTS-STARTPTS')
+            )
+            parts.extend([self._conform_video(video, video_info), audio])
+            if outro:
+                parts.extend([self._conform_video(outro[0][i], video_info), outro[1][i]])
+
+            joined = ffmpeg.concat(*parts, v=1, a=1).node
+            outputs.append(ffmpeg.output(
+                joined[0],
+                joined[1],
+                str(output_path),
+                **_encode_args(quality_settings, filtered=True),
+                **self._mux_args(output_path)
+            ))
+
+        try:
+            await self._run_async(ffmpeg.compile(ffmpeg.merge_outputs(*outputs), overwrite_output=True))
+        except ffmpeg.Error as e:
+            logger.error(f"Error splitting video with intro/outro: {e.stderr.decode()}")
+            raise
+
+        for output_path in output_files:
+            logger.info(f"Created segment: {output_path}")
+
+        return output_files
+
     def add_intro_outro(self,
                        video_path: Path,
                        intro_path: Optional[Path] = None,
                        outro_path: Optional[Path] = None,
-                       output_path: Path = None) -> Path:
-        """Add intro and/or outro to a video"""
+                       output_path: Optional[Path] = None,
+                       quality_settings: Optional[Dict] = None) -> Path:
+        """Add intro and/or outro to a video
+
+        The files are joined with the concat demuxer and a stream copy. When
+        ``quality_settings`` is given the files are instead concatenated in a
+        filter graph and re-encoded, which also handles mismatched inputs.
+        """
+        return run_sync(self.add_intro_outro_async(
+            video_path, intro_path, outro_path, output_path, quality_settings
+        ))
+
+    async def add_intro_outro_async(self,
+                                    video_path: Path,
+                                    intro_path: Optional[Path] = None,
+                                    outro_path: Optional[Path] = None,
+                                    output_path: Optional[Path] = None,
+                                    quality_settings: Optional[Dict] = None) -> Path:
+        """Coroutine version of :meth:`add_intro_outro`"""
         if not intro_path and not outro_path:
             # No intro or outro, just return original
             return video_path
@@ -125,44 +941,135 @@ class VideoProcessor:
             output_path = video_path.parent / f"processed_{video_path.name}"
         
         # Build concat list
-        concat_files = []
-        if intro_path and intro_path.exists():
+        existing = _existing_files([path for path in (intro_path, outro_path) if path])
+        concat_files: List[Path] = []
+        if intro_path and intro_path in existing:
             concat_files.append(intro_path)
         concat_files.append(video_path)
-        if outro_path and outro_path.exists():
+        if outro_path and outro_path in existing:
             concat_files.append(outro_path)
         
-        # Create temporary file list for concat
-        list_file = video_path.parent / "concat_list.txt"
-        with open(list_file, 'w') as f:
-            for file in concat_files:
-                f.write(f"file '{file.absolute()}'\n")
+        list_file = None
+        if quality_settings is not None:
+            stream = self._concat_reencode(concat_files, video_path, output_path, quality_settings)
+            argv = ffmpeg.compile(stream, overwrite_output=True)
+        else:
+            # Create temporary file list for concat, one per video so that
+            # several segments can be processed at the same time
+            list_file = video_path.parent / f".{video_path.stem}_concat.txt"
+            list_file.write_text(
+                ''.join(f"file '{_resolved_path(file)}'\n" for file in concat_files),
+                encoding='utf-8'
+            )
+            
+            # Use concat demuxer
+            argv = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0',
+                    '-i', str(list_file), '-c', 'copy',
+                    *_option_argv(self._mux_args(output_path)), str(output_path)]
         
         try:
-            # Use concat demuxer
-            stream = ffmpeg.input(str(list_file), format='concat', safe=0)
-            stream = ffmpeg.output(stream, str(output_path), c='copy')
-            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
-            
-            # Clean up temp file
-            list_file.unlink()
-            
+            await self._run_async(argv)
             logger.info(f"Created video with intro/outro: {output_path}")
             return output_path
-        
         except ffmpeg.Error as e:
             logger.error(f"Error adding intro/outro: {e.stderr.decode()}")
-            if list_file.exists():
-                list_file.unlink()
             raise
+        finally:
+            # Clean up temp file
+            if list_file:
+                list_file.unlink(missing_ok=True)
+
+    def _concat_reencode(self,
+                         concat_files: List[Path],
+                         video_path: Path,
+                         output_path: Path,
+                         quality_settings: Dict) -> Any:
+        """Build a filter graph concatenating files, re-encoded to the main video's format"""
+        video_info = self.get_video_info(video_path)
+        
+        # Conform every input to the main video before concatenating
+        streams = []
+        for file in concat_files:
+            source = ffmpeg.input(str(file))
+            streams.extend([self._conform_video(source.video, video_info), source.audio])
+        
+        joined = ffmpeg.concat(*streams, v=1, a=1).node
+        return ffmpeg.output(
+            joined[0],
+            joined[1],
+            str(output_path),
+            **_encode_args(quality_settings, filtered=True),
+            **self._mux_args(output_path)
+        )
+
+    @staticmethod
+    async def _run_async(argv: List[str],
+                         time_callback: Optional[Callable[[float], None]] = None) -> None:
+        """Run an FFmpeg command line without blocking the event loop
+
+        ``time_callback`` is called with the output position in seconds as
+        FFmpeg reports its progress.
+        """
+        stderr_tail: Deque[bytes] = deque(maxlen=STDERR_TAIL_LINES)
+        progress_args = ['-progress', 'pipe:1'] if time_callback else []
+        process = await asyncio.create_subprocess_exec(
+            argv[0], '-nostats', *progress_args, *argv[1:],
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE if time_callback else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        async def read_log() -> None:
+            assert process.stderr is not None
+            async for line in process.stderr:
+                stderr_tail.append(line)
+
+        try:
+            if time_callback:
+                assert process.stdout is not None
+                await asyncio.gather(read_log(), _read_progress(process.stdout, time_callback))
+            else:
+                await read_log()
+            await process.wait()
+        except BaseException:
+            # Cancelled, e.g. because another segment failed: don't leave FFmpeg running
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        if process.returncode != 0:
+            raise ffmpeg.Error('ffmpeg', b'', b''.join(stderr_tail))
     
-    def validate_compatibility(self, *video_paths: Path) -> bool:
-        """Check if videos have compatible formats for concatenation"""
+    def can_stream_copy(self, video_info: Dict, extension: str) -> bool:
+        """Check if the video stream can be copied into the given container without re-encoding"""
+        supported = CONTAINER_CODECS.get(extension.lower())
+        return supported is None or video_info['codec'] in supported
+
+    def validate_compatibility(self, *video_paths: Path, output_format: Optional[str] = None) -> bool:
+        """Check if videos have compatible formats for concatenation
+
+        When the first video is split before joining, ``output_format`` is the
+        extension of its segments, whose container is compared instead.
+        """
         if len(video_paths) < 2:
             return True
         
         try:
-            infos = [self.get_video_info(path) for path in video_paths if path.exists()]
+            paths = [path for path in video_paths if path.exists()]
+            
+            # Different containers can't be joined with the concat demuxer,
+            # which a few header bytes are enough to tell
+            containers = [detect_container(header) for header in read_file_headers(paths, CONTAINER_HEADER_SIZE)]
+            if output_format is not None and paths and paths[0] == video_paths[0]:
+                containers[0] = EXTENSION_CONTAINERS.get(output_format.lower())
+            distinct = set(containers)
+            if len(distinct) > 1 and None not in distinct:
+                logger.warning(f"Videos have different containers: {sorted(distinct, key=str)}")
+                return False
+            
+            # Probe all files at once, each probe waits on its own ffprobe
+            with ThreadPoolExecutor(max_workers=max(1, min(8, len(paths)))) as executor:
+                infos = list(executor.map(self.get_video_info, paths))
             
             # Check resolution compatibility
             resolutions = [(info['width'], info['height']) for info in infos]
@@ -185,11 +1092,54 @@ class VideoProcessor:
     def create_thumbnail(self, video_path: Path, output_path: Path, time_offset: float = 5.0) -> Path:
         """Extract a thumbnail from the video"""
         try:
-            stream = ffmpeg.input(str(video_path), ss=time_offset)
-            stream = ffmpeg.output(stream, str(output_path), vframes=1)
-            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+            _run_ffmpeg(['ffmpeg', '-y', '-ss', str(time_offset), '-i', str(video_path),
+                         '-vframes', '1', str(output_path)])
             logger.info(f"Created thumbnail: {output_path}")
             return output_path
         except ffmpeg.Error as e:
             logger.error(f"Error creating thumbnail: {e.stderr.decode()}")
-            raise
\ No newline at end of file
+            raise
+
+    def create_thumbnails(self, video_paths: List[Path], width: int = 320) -> List[bytes]:
+        """Extract the first frame of each video as a JPEG image
+
+        Videos are processed THUMBNAIL_BATCH_SIZE at a time, one FFmpeg run per
+        batch. If a batch yields the wrong number of images, its videos are
+        retried one by one so that images always line up with ``video_paths``.
+        """
+        images = []
+        for first in range(0, len(video_paths), THUMBNAIL_BATCH_SIZE):
+            batch = video_paths[first:first + THUMBNAIL_BATCH_SIZE]
+            batch_images = self._thumbnail_batch(batch, width)
+            if len(batch_images) != len(batch):
+                logger.warning(f"Got {len(batch_images)} thumbnails for {len(batch)} videos, "
+                               "extracting them one at a time")
+                batch_images = []
+                for path in batch:
+                    single = self._thumbnail_batch([path], width)
+                    if len(single) != 1:
+                        raise ValueError(f"Could not extract a thumbnail from {path}")
+                    batch_images.extend(single)
+            images.extend(batch_images)
+        return images
+
+    def _thumbnail_batch(self, video_paths: List[Path], width: int) -> List[bytes]:
+        """First frame of each video as JPEG images, from a single FFmpeg run
+
+        The videos are expected to share a resolution, like segments of one input.
+        """
+        argv = ['ffmpeg', '-nostats', '-v', 'error']
+        filters = []
+        for i, path in enumerate(video_paths):
+            argv += ['-t', '1', '-i', str(path)]
+            filters.append(f"[{i}:v]trim=end_frame=1,scale={width}:-2,setsar=1[v{i}]")
+        labels = ''.join(f"[v{i}]" for i in range(len(video_paths)))
+        filters.append(f"{labels}concat=n={len(video_paths)}:v=1:a=0[out]")
+        argv += ['-filter_complex', ';'.join(filters), '-map', '[out]',
+                 '-fps_mode', 'passthrough', '-f', 'image2pipe', '-c:v', 'mjpeg', 'pipe:1']
+
+        result = subprocess.run(argv, stdin=subprocess.DEVNULL, capture_output=True)
+        if result.returncode != 0:
+            logger.error(f"Error creating thumbnails: {result.stderr.decode()}")
+            raise ffmpeg.Error('ffmpeg', result.stdout, result.stderr)
+        return _split_jpegs(result.stdout)
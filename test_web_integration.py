@@ -33,7 +33,8 @@ def create_test_segment():
     ]
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        # A 65 second stream copy takes well under a second
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
         if result.returncode == 0 and os.path.exists(test_video):
             size_mb = os.path.getsize(test_video) / (1024*1024)
             print(f"✅ Created test segment: {test_video} ({size_mb:.1f} MB)")
@@ -9,6 +9,22 @@ import subprocess
 import requests
 from pathlib import Path
 
+# Shared so every probe reuses one keep-alive connection
+SESSION = requests.Session()
+
+def wait_for_server(url, timeout=10):
+    """Poll the server until it answers, backing off between attempts"""
+    start = time.monotonic()
+    delay = 0.05
+    while time.monotonic() - start < timeout:
+        try:
+            return SESSION.get(url, timeout=0.5)
+        except requests.RequestException:
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+    # Last attempt, raising the connection error if the server is still down
+    return SESSION.get(url, timeout=1)
+
 def test_server_startup():
     """Test that the server can start"""
     print("🧪 Testing server startup...")
@@ -19,12 +35,9 @@ def test_server_startup():
         'main:app', '--host', '0.0.0.0', '--port', '8001'
     ], cwd='web/backend', stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     
-    # Wait for server to start
-    time.sleep(3)
-    
     try:
-        # Test if server is running
-        response = requests.get('http://localhost:8001')
+        # Wait for server to start and test if it is running
+        response = wait_for_server('http://localhost:8001')
         if response.status_code == 200:
             print("✅ Server started successfully")
             return True, server_process
@@ -45,7 +58,7 @@ def test_api_endpoints(base_url='http://localhost:8001'):
     # Test root endpoint
     tests_total += 1
     try:
-        response = requests.get(f'{base_url}/')
+        response = SESSION.get(f'{base_url}/')
         if response.status_code == 200 and 'Livestream Splitter' in response.text:
             print("✅ Root endpoint works")
             tests_passed += 1
@@ -57,7 +70,7 @@ def test_api_endpoints(base_url='http://localhost:8001'):
     # Test jobs listing
     tests_total += 1
     try:
-        response = requests.get(f'{base_url}/api/jobs')
+        response = SESSION.get(f'{base_url}/api/jobs')
         if response.status_code == 200:
             print("✅ Jobs endpoint works")
             tests_passed += 1
@@ -69,7 +82,7 @@ def test_api_endpoints(base_url='http://localhost:8001'):
     # Test API docs
     tests_total += 1
     try:
-        response = requests.get(f'{base_url}/docs')
+        response = SESSION.get(f'{base_url}/docs')
         if response.status_code == 200:
             print("✅ API documentation available")
             tests_passed += 1
@@ -81,24 +94,23 @@ def test_api_endpoints(base_url='http://localhost:8001'):
     return tests_passed == tests_total
 
 def test_file_upload_simulation(base_url='http://localhost:8001'):
-    """Test file upload endpoint with a small test file"""
+    """Test that the upload endpoint rejects files that are not videos"""
     print("🧪 Testing file upload...")
     
-    # Create a small test video file
+    # Create a small file with a video extension but no video inside
     test_file = Path("test_video.mp4")
     test_file.write_bytes(b"fake video content for testing")
     
     try:
         with open(test_file, 'rb') as f:
             files = {'file': ('test_video.mp4', f, 'video/mp4')}
-            response = requests.post(f'{base_url}/api/upload', files=files)
+            response = SESSION.post(f'{base_url}/api/upload', files=files)
         
-        if response.status_code == 200:
-            result = response.json()
-            print(f"✅ File upload works: {result}")
+        if response.status_code == 400:
+            print(f"✅ File upload rejects non-video content: {response.json()}")
             return True
         else:
-            print(f"❌ File upload failed: {response.status_code}")
+            print(f"❌ File upload accepted non-video content: {response.status_code}")
             return False
     except Exception as e:
         print(f"❌ File upload error: {e}")
@@ -131,9 +143,6 @@ def main():
             print("⚠️  Server startup failed, skipping other tests")
             return
         
-        # Give server a moment to fully initialize
-        time.sleep(1)
-        
         # Test 2: API endpoints
         if not test_api_endpoints():
             all_passed = False
@@ -1,68 +1,57 @@
 """Tests for configuration handling"""
 
 import pytest
-import tempfile
 from pathlib import Path
 from pydantic import ValidationError
 
 from stream_splitter.config import Config, OutputConfig, IntroOutroConfig, ProcessingConfig
 
 
+@pytest.fixture(scope="session")
+def fake_video(tmp_path_factory):
+    """A placeholder video file shared by every test in the session"""
+    path = tmp_path_factory.mktemp("video") / "fake.mp4"
+    path.write_bytes(b'fake video data')
+    return path
+
+
 class TestConfig:
     """Test configuration loading and validation"""
     
-    def test_default_config(self):
+    def test_default_config(self, fake_video):
         """Test default configuration values"""
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp:
-            tmp.write(b'fake video data')
-            tmp_path = Path(tmp.name)
+        config = Config(input_path=fake_video)
         
-        try:
-            config = Config(input_path=tmp_path)
-            
-            assert config.input_path == tmp_path
-            assert config.output.max_segment_length == 1200
-            assert config.output.format == "mp4"
-            assert config.processing.quality == "high"
-        finally:
-            tmp_path.unlink()
+        assert config.input_path == fake_video
+        assert config.output.max_segment_length == 1200
+        assert config.output.format == "mp4"
+        assert config.processing.quality == "high"
     
     def test_invalid_input_path(self):
         """Test validation of non-existent input file"""
         with pytest.raises(ValidationError):
             Config(input_path=Path("non_existent_file.mp4"))
     
-    def test_invalid_segment_length(self):
+    def test_invalid_segment_length(self, fake_video):
         """Test validation of segment length"""
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp:
-            tmp.write(b'fake video data')
-            tmp_path = Path(tmp.name)
+        # Too short
+        with pytest.raises(ValidationError):
+            Config(
+                input_path=fake_video,
+                output=OutputConfig(max_segment_length=30)
+            )
         
-        try:
-            # Too short
-            with pytest.raises(ValidationError):
-                Config(
-                    input_path=tmp_path,
-                    output=OutputConfig(max_segment_length=30)
-                )
-            
-            # Too long
-            with pytest.raises(ValidationError):
-                Config(
-                    input_path=tmp_path,
-                    output=OutputConfig(max_segment_length=8000)
-                )
-        finally:
-            tmp_path.unlink()
+        # Too long
+        with pytest.raises(ValidationError):
+            Config(
+                input_path=fake_video,
+                output=OutputConfig(max_segment_length=8000)
+            )
     
-    def test_yaml_loading(self):
+    def test_yaml_loading(self, fake_video, tmp_path):
         """Test loading configuration from YAML"""
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as video_tmp:
-            video_tmp.write(b'fake video data')
-            video_path = Path(video_tmp.name)
-        
         yaml_content = f"""
-input_path: "{video_path}"
+input_path: "{fake_video}"
 output:
   directory: "./test_segments"
   max_segment_length: 900
@@ -70,20 +59,27 @@ processing:
   quality: "medium"
   threads: 2
 """
+        yaml_path = tmp_path / "config.yaml"
+        yaml_path.write_text(yaml_content)
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as yaml_tmp:
-            yaml_tmp.write(yaml_content)
-            yaml_path = Path(yaml_tmp.name)
+        config = Config.from_yaml(yaml_path)
+        assert config.input_path == fake_video
+        assert config.output.max_segment_length == 900
+        assert config.processing.quality == "medium"
+        assert config.processing.threads == 2
+    
+    def test_json_round_trip(self, fake_video, tmp_path):
+        """Test saving and loading configuration as JSON"""
+        json_path = tmp_path / "config.json"
         
-        try:
-            config = Config.from_yaml(yaml_path)
-            assert config.input_path == video_path
-            assert config.output.max_segment_length == 900
-            assert config.processing.quality == "medium"
-            assert config.processing.threads == 2
-        finally:
-            video_path.unlink()
-            yaml_path.unlink()
+        config = Config(
+            input_path=fake_video,
+            output=OutputConfig(directory=tmp_path / "out", max_segment_length=900)
+        )
+        config.save_json(json_path)
+        loaded = Config.from_json(json_path)
+        
+        assert loaded == config
 
 
 class TestUtils:
@@ -96,6 +92,7 @@ class TestUtils:
         assert format_duration(30) == "30s"
         assert format_duration(90) == "1m 30s"
         assert format_duration(3661) == "1h 1m 1s"
+        assert format_duration(90000) == "25h 0m 0s"
     
     def test_sanitize_filename(self):
         """Test filename sanitization"""
@@ -112,4 +109,25 @@ class TestUtils:
         assert parse_time_string("120") == 120
         assert parse_time_string("2m") == 120
         assert parse_time_string("1h30m") == 5400
-        assert parse_time_string("1:30:00") == 5400
\ No newline at end of file
+        assert parse_time_string("1:30:00") == 5400
+    
+    def test_human_readable_size(self):
+        """Test byte size formatting"""
+        from stream_splitter.utils import human_readable_size
+        
+        assert human_readable_size(500) == "500.0 B"
+        assert human_readable_size(1536) == "1.5 KB"
+        assert human_readable_size(5 * 1024 ** 4) == "5.0 TB"
+        assert human_readable_size(2048 * 1024 ** 5) == "2048.0 PB"
+    
+    def test_keyframe_split_points(self):
+        """Test cut planning on keyframe boundaries"""
+        from stream_splitter.utils import keyframe_split_points
+        
+        keyframes = [i * 2.0 for i in range(91)]
+        assert keyframe_split_points(keyframes, 60, 170) == [60.0, 120.0]
+        # Cuts never land after the maximum length when a keyframe is available
+        assert keyframe_split_points([0, 10, 55, 70, 110], 60, 150) == [55, 110]
+        # GOPs longer than the maximum still make progress
+        assert keyframe_split_points([0, 100, 200], 60, 250) == [100, 200]
+        assert keyframe_split_points(keyframes, 60, 50) == []
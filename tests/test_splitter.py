@@ -0,0 +1,82 @@
+"""Tests for the splitter orchestration"""
+
+import pytest
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from stream_splitter.config import Config, OutputConfig
+from stream_splitter.splitter import Splitter, _Progress
+
+
+class TestNamingPattern:
+    """Test output file naming"""
+    
+    def _make_splitter(self, tmp_dir: str, naming_pattern: str) -> Splitter:
+        video_path = Path(tmp_dir) / "my stream.mp4"
+        video_path.write_bytes(b'fake video data')
+        config = Config(
+            input_path=video_path,
+            output=OutputConfig(directory=Path(tmp_dir) / "out", naming_pattern=naming_pattern)
+        )
+        return Splitter(config)
+    
+    def test_default_pattern(self):
+        """Test the default naming pattern"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            splitter = self._make_splitter(tmp_dir, "{title}_part{index:02d}_{date}")
+            date_str = datetime.now().strftime("%Y%m%d")
+            
+            assert splitter._segment_path(3) == Path(tmp_dir) / "out" / f"my_stream_part03_{date_str}.mp4"
+    
+    def test_other_index_formats(self):
+        """Test index placeholders other than {index:02d}"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            assert self._make_splitter(tmp_dir, "Segment{index:03d}_{title}")._segment_path(7).name == \
+                "Segment007_my_stream.mp4"
+            assert self._make_splitter(tmp_dir, "{title}_{index}")._segment_path(12).name == \
+                "my_stream_12.mp4"
+    
+    def test_unknown_placeholder(self):
+        """Test rejection of unsupported placeholders"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with pytest.raises(ValueError):
+                self._make_splitter(tmp_dir, "{title}_{episode}")
+
+
+class TestProgress:
+    """Test job progress reporting"""
+    
+    def test_position_from_out_time(self):
+        """Test that FFmpeg's position is a fraction of the duration"""
+        reported = []
+        progress = _Progress(reported.append, num_segments=4, duration=200.0)
+        progress.position(50.0)
+        progress.position(150.0)
+        
+        assert reported == [0.25, 0.75]
+    
+    def test_never_goes_backwards(self):
+        """Test that an earlier position or finished segments don't lower progress"""
+        reported = []
+        progress = _Progress(reported.append, num_segments=4, duration=200.0)
+        progress.position(100.0)
+        progress.position(20.0)
+        progress.segment_done()
+        
+        assert reported == [0.5, 0.5, 0.5]
+    
+    def test_segments_and_cap(self):
+        """Test progress from finished segments, capped at the whole job"""
+        reported = []
+        progress = _Progress(reported.append, num_segments=2, duration=200.0)
+        progress.segment_done(Path("part01.mp4"))
+        progress.position(250.0)
+        
+        assert reported == [0.5, 1.0]
+    
+    def test_no_callback(self):
+        """Test that progress can be tracked without a callback"""
+        progress = _Progress(None, num_segments=0, duration=0.0)
+        progress.position(10.0)
+        progress.segment_done()
@@ -0,0 +1,142 @@
+"""Tests for FFmpeg-independent parts of the video processor"""
+
+import tempfile
+from pathlib import Path
+
+from stream_splitter.utils import keyframe_split_points
+from stream_splitter.video_processor import VideoProcessor, detect_container, _parse_keyframes, _split_jpegs
+
+
+class TestContainerCheck:
+    """Test container detection from file signatures"""
+    
+    def test_detect_container(self):
+        """Test known and unknown signatures"""
+        assert detect_container(b'\x00\x00\x00\x18ftypisom') == 'mp4'
+        assert detect_container(b'\x1a\x45\xdf\xa3\x01\x00') == 'matroska'
+        assert detect_container(b'RIFF\x00\x00\x00\x00AVI ') == 'avi'
+        assert detect_container(b'\x00\x00\x00\x08wide') == 'mp4'
+        assert detect_container(b'FLV\x01\x05\x00\x00\x00\x09') == 'flv'
+        assert detect_container(b'not a video') is None
+    
+    def test_detect_mpegts(self):
+        """Test that MPEG-TS needs the sync byte of two consecutive packets"""
+        packet = b'\x47' + b'\x00' * 187
+        assert detect_container(packet * 2) == 'mpegts'
+        assert detect_container(packet) is None
+        assert detect_container(b'GIF89a' + b'\x00' * 200) is None
+        assert detect_container(b'Garbage text file' + b' ' * 200) is None
+    
+    def test_detect_riff(self):
+        """Test that only AVI RIFF files are accepted"""
+        assert detect_container(b'RIFF\x00\x00\x00\x00WAVEfmt ') is None
+        assert detect_container(b'RIFF\x00\x00\x00\x00WEBPVP8 ') is None
+    
+    def test_mismatched_containers_skip_probe(self):
+        """Test that different containers are rejected without probing"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mp4 = Path(tmp_dir) / "intro.mp4"
+            mkv = Path(tmp_dir) / "main.mkv"
+            mp4.write_bytes(b'\x00\x00\x00\x18ftypisom' + b'\x00' * 16)
+            mkv.write_bytes(b'\x1a\x45\xdf\xa3' + b'\x00' * 16)
+            
+            probed = []
+            processor = VideoProcessor()
+            processor.get_video_info = probed.append
+            
+            assert processor.validate_compatibility(mp4, mkv) is False
+            assert probed == []
+    
+    def test_segments_compared_in_output_format(self):
+        """Test that a TS recording with MP4 bookends is checked as MP4 segments"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ts = Path(tmp_dir) / "stream.ts"
+            mp4 = Path(tmp_dir) / "intro.mp4"
+            ts.write_bytes((b'\x47' + b'\x00' * 187) * 2)
+            mp4.write_bytes(b'\x00\x00\x00\x18ftypisom' + b'\x00' * 16)
+            
+            processor = VideoProcessor()
+            processor.get_video_info = lambda path: {'width': 1920, 'height': 1080, 'codec': 'h264'}
+            
+            assert processor.validate_compatibility(ts, mp4, output_format='mp4') is True
+            assert processor.validate_compatibility(ts, mp4, output_format='mkv') is False
+
+
+class TestKeyframes:
+    """Test keyframe listing and cut planning"""
+    
+    def test_start_offset(self):
+        """Test that cuts are planned from the file's start time, not 0"""
+        output = ''.join(
+            f"packet,{10000 + i * 2.0:.6f},{'K_' if i % 2 == 0 else '__'}\n" for i in range(91)
+        ) + "format,10000.000000\n"
+        
+        keyframes = _parse_keyframes(output)
+        assert keyframes[:3] == [0.0, 4.0, 8.0]
+        assert keyframe_split_points(keyframes, 60, 180) == [60.0, 120.0]
+    
+    def test_missing_start_time(self):
+        """Test listings without a usable start time"""
+        assert _parse_keyframes("packet,1.5,K_\npacket,0.5,K_\npacket,1.0,__\nformat,N/A\n") == [0.5, 1.5]
+
+
+class TestProbeMemo:
+    """Test the in-memory probe cache"""
+    
+    def test_memo_is_bounded(self, tmp_path, monkeypatch):
+        """Test that the least recently used files are evicted"""
+        from stream_splitter import video_processor
+        
+        monkeypatch.setattr(video_processor, 'PROBE_MEMO_SIZE', 2)
+        monkeypatch.setattr(video_processor, '_PROBE_MEMO', video_processor.OrderedDict())
+        files = []
+        for name in ('a', 'b', 'c'):
+            path = tmp_path / f"{name}.mp4"
+            path.write_bytes(b'x')
+            files.append(path)
+        
+        processor = VideoProcessor()
+        probes = []
+        
+        def probe(path):
+            return processor._cached_probe(path, 'video_info', lambda: probes.append(path) or path.name)
+        
+        probe(files[0])
+        probe(files[1])
+        probe(files[0])  # Refreshes a.mp4, b.mp4 becomes the oldest
+        probe(files[2])
+        probe(files[0])
+        probe(files[1])
+        
+        assert probes == [files[0], files[1], files[2], files[1]]
+        assert len(video_processor._PROBE_MEMO) == 2
+
+
+class TestThumbnails:
+    """Test splitting FFmpeg's image2pipe output"""
+    
+    def test_split_jpegs(self):
+        """Test that concatenated JPEGs are split at their markers"""
+        first = b'\xff\xd8first\xff\xd9'
+        second = b'\xff\xd8second\xff\xd9'
+        
+        assert _split_jpegs(first + second) == [first, second]
+        assert _split_jpegs(first + b'\xff\xd8truncated') == [first]
+        assert _split_jpegs(b'') == []
+    
+    def test_short_batch_falls_back(self):
+        """Test that a batch missing images is retried file by file"""
+        paths = [Path(f"part{i:02d}.mp4") for i in range(40)]
+        runs = []
+        
+        def fake_batch(batch, width):
+            runs.append(len(batch))
+            images = [path.name.encode() for path in batch]
+            # The first run drops an image
+            return images[:-1] if len(runs) == 1 else images
+        
+        processor = VideoProcessor()
+        processor._thumbnail_batch = fake_batch
+        
+        assert processor.create_thumbnails(paths) == [path.name.encode() for path in paths]
+        assert runs == [32] + [1] * 32 + [8]
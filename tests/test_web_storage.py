@@ -0,0 +1,112 @@
+"""Tests for the web backend's upload and download file handling"""
+
+import io
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend is run from its own directory, not installed as a package
+sys.path.insert(0, str(Path(__file__).parent.parent / "web" / "backend"))
+
+import storage  # noqa: E402
+from storage import parse_range, prune_upload_index, read_file_range, save_upload  # noqa: E402
+
+
+class TestParseRange:
+    """Test Range header parsing for downloads"""
+
+    def test_closed_range(self):
+        """Test a start and end, with the end clamped to the file"""
+        assert parse_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_range("bytes=900-5000", 1000) == (900, 999)
+
+    def test_open_ended_range(self):
+        """Test that a missing end reads to the end of the file"""
+        assert parse_range("bytes=100-", 1000) == (100, 999)
+
+    def test_suffix_range(self):
+        """Test that "-N" asks for the last N bytes"""
+        assert parse_range("bytes=-100", 1000) == (900, 999)
+        assert parse_range("bytes=-5000", 1000) == (0, 999)
+
+    def test_unsatisfiable_range(self):
+        """Test that ranges past the end return a start the caller answers with 416"""
+        start, _ = parse_range("bytes=1000-", 1000)
+        assert start >= 1000
+        start, _ = parse_range("bytes=2000-3000", 1000)
+        assert start >= 1000
+        start, _ = parse_range("bytes=-0", 1000)
+        assert start >= 1000
+
+    def test_ignored_headers(self):
+        """Test that malformed, multiple and non-byte ranges send the whole file"""
+        assert parse_range("bytes=abc-", 1000) is None
+        assert parse_range("bytes=-", 1000) is None
+        assert parse_range("bytes=500-100", 1000) is None
+        assert parse_range("bytes=0-10,20-30", 1000) is None
+        assert parse_range("items=0-10", 1000) is None
+
+    def test_read_file_range(self, tmp_path, monkeypatch):
+        """Test that exactly the inclusive range is read, across blocks"""
+        monkeypatch.setattr(storage, 'DOWNLOAD_CHUNK_SIZE', 3)
+        path = tmp_path / "segment.mp4"
+        path.write_bytes(bytes(range(20)))
+
+        assert b''.join(read_file_range(path, 5, 14)) == bytes(range(5, 15))
+
+
+class TestSaveUpload:
+    """Test that uploads are deduplicated through the hard-link index"""
+
+    @pytest.fixture
+    def index_dir(self, tmp_path, monkeypatch):
+        index_dir = tmp_path / ".index"
+        index_dir.mkdir()
+        monkeypatch.setattr(storage, 'UPLOAD_INDEX_DIR', index_dir)
+        return index_dir
+
+    def test_size_and_checksum(self, tmp_path, index_dir):
+        """Test that the header and the rest of the upload are both saved"""
+        path = tmp_path / "stream.mp4"
+        size, checksum = save_upload(b'head', io.BytesIO(b'body'), path)
+
+        assert path.read_bytes() == b'headbody'
+        assert size == 8
+        assert (index_dir / checksum).samefile(path)
+
+    def test_duplicate_upload_is_linked(self, tmp_path, index_dir):
+        """Test that the same content uploaded twice shares one file"""
+        first = tmp_path / "first.mp4"
+        second = tmp_path / "second.mp4"
+        _, checksum = save_upload(b'head', io.BytesIO(b'body'), first)
+        _, second_checksum = save_upload(b'head', io.BytesIO(b'body'), second)
+
+        assert second_checksum == checksum
+        assert second.samefile(first)
+        assert os.stat(first).st_nlink == 3
+
+    def test_replaced_upload_is_pruned(self, tmp_path, index_dir):
+        """Test that re-uploading a name drops the old version from the index"""
+        path = tmp_path / "stream.mp4"
+        _, old_checksum = save_upload(b'head', io.BytesIO(b'old'), path)
+        _, new_checksum = save_upload(b'head', io.BytesIO(b'new'), path)
+
+        assert not (index_dir / old_checksum).exists()
+        assert (index_dir / new_checksum).samefile(path)
+
+    def test_prune_unlinked_uploads(self, tmp_path, index_dir):
+        """Test that only index entries with no other link are removed"""
+        kept = tmp_path / "kept.mp4"
+        deleted = tmp_path / "deleted.mp4"
+        _, kept_checksum = save_upload(b'head', io.BytesIO(b'kept'), kept)
+        _, deleted_checksum = save_upload(b'head', io.BytesIO(b'deleted'), deleted)
+        (index_dir / ".probe_cache.json").write_text("{}")
+
+        deleted.unlink()
+        prune_upload_index()
+
+        assert (index_dir / kept_checksum).exists()
+        assert not (index_dir / deleted_checksum).exists()
+        assert (index_dir / ".probe_cache.json").exists()
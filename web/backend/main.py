@@ -3,20 +3,29 @@
 import os
 import asyncio
 import json
+import mimetypes
 from pathlib import Path
 from typing import List, Optional
 from datetime import datetime
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Optional: share jobs between several server processes
+    redis_asyncio = None
+
 # Import our splitter components
 from stream_splitter.config import Config, OutputConfig, ProcessingConfig
 from stream_splitter.splitter import Splitter
+from stream_splitter.video_processor import CONTAINER_HEADER_SIZE, VideoProcessor, detect_container
+
+from storage import UPLOAD_INDEX_DIR, parse_range, prune_upload_index, read_file_range, save_upload
 
 
 app = FastAPI(title="Livestream Splitter Web UI", version="1.0.0")
@@ -35,9 +44,22 @@ from pathlib import Path
 static_dir = Path(__file__).parent.parent / "frontend"
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
-# Global variables for job tracking
-jobs = {}
-job_counter = 0
+# File extensions accepted for upload
+SUPPORTED_EXTENSIONS = frozenset({'.mp4', '.mkv', '.avi', '.mov', '.flv', '.webm', '.ts'})
+
+# Start of each upload checked for a container signature before saving
+UPLOAD_HEADER_SIZE = max(16 * 1024, CONTAINER_HEADER_SIZE)
+
+# Videos split at the same time; each FFmpeg gets an equal share of the CPUs
+MAX_JOBS = max(1, int(os.environ.get('SPLITTER_MAX_JOBS', (os.cpu_count() or 1) // 4)))
+THREADS_PER_JOB = max(1, min(16, (os.cpu_count() or 1) // MAX_JOBS))
+
+# Redis server used to share job statuses between uvicorn workers, if set
+REDIS_URL = os.environ.get('SPLITTER_REDIS_URL')
+# Seconds a job status is kept in Redis
+JOB_TTL = 24 * 60 * 60
+
+job_semaphore: Optional[asyncio.Semaphore] = None
 
 
 class SplitRequest(BaseModel):
@@ -60,6 +82,57 @@ class JobStatus(BaseModel):
     error: Optional[str] = None
 
 
+class JobStore:
+    """Job statuses kept in memory, visible to this process only"""
+    
+    def __init__(self):
+        self._jobs = {}
+        self._counter = 0
+    
+    async def next_id(self) -> int:
+        self._counter += 1
+        return self._counter
+    
+    async def save(self, job: JobStatus) -> None:
+        self._jobs[job.id] = job
+    
+    async def get(self, job_id: int) -> Optional[JobStatus]:
+        return self._jobs.get(job_id)
+    
+    async def list(self) -> List[JobStatus]:
+        return list(self._jobs.values())
+
+
+class RedisJobStore(JobStore):
+    """Job statuses kept in Redis, so that several server processes share them"""
+    
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("SPLITTER_REDIS_URL is set but the redis package is not installed")
+        self._redis = redis_asyncio.from_url(url)
+    
+    async def next_id(self) -> int:
+        return await self._redis.incr('job_counter')
+    
+    async def save(self, job: JobStatus) -> None:
+        await self._redis.set(f'job:{job.id}', job.model_dump_json(), ex=JOB_TTL)
+    
+    async def get(self, job_id: int) -> Optional[JobStatus]:
+        data = await self._redis.get(f'job:{job_id}')
+        return JobStatus.model_validate_json(data) if data else None
+    
+    async def list(self) -> List[JobStatus]:
+        keys = [key async for key in self._redis.scan_iter('job:*')]
+        if not keys:
+            return []
+        values = await self._redis.mget(keys)
+        jobs = [JobStatus.model_validate_json(data) for data in values if data]
+        return sorted(jobs, key=lambda job: job.id)
+
+
+job_store = RedisJobStore(REDIS_URL) if REDIS_URL else JobStore()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Serve the main web interface"""
@@ -72,33 +145,39 @@ async def root():
 @app.post("/api/upload")
 async def upload_video(file: UploadFile = File(...)):
     """Upload a video file for processing"""
-    if not file.filename.lower().endswith(('.mp4', '.mkv', '.avi', '.mov', '.flv', '.webm', '.ts')):
+    if Path(file.filename).suffix.lower() not in SUPPORTED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Unsupported file format")
     
     # Create uploads directory
     upload_dir = Path("uploads")
-    upload_dir.mkdir(exist_ok=True)
+    UPLOAD_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    
+    # The extension can't be trusted, check the container signature first
+    header = await file.read(UPLOAD_HEADER_SIZE)
+    if detect_container(header) is None:
+        raise HTTPException(status_code=400, detail="File is not a supported video")
     
-    # Save uploaded file in chunks to handle large files
+    # Save uploaded file in large blocks, off the event loop
     file_path = upload_dir / file.filename
-    total_size = 0
+    loop = asyncio.get_running_loop()
     
     try:
-        with open(file_path, "wb") as buffer:
-            while True:
-                # Read file in chunks (1MB at a time)
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                buffer.write(chunk)
-                total_size += len(chunk)
+        total_size, checksum = await loop.run_in_executor(None, save_upload, header, file.file, file_path)
     except Exception as e:
         # Clean up partial file on error
         if file_path.exists():
             file_path.unlink()
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
     
-    return {"filename": file.filename, "path": str(file_path), "size": total_size}
+    # Make sure FFmpeg can read it now rather than failing in the split job
+    try:
+        await loop.run_in_executor(None, VideoProcessor(cache_dir=UPLOAD_INDEX_DIR).get_video_info, file_path)
+    except Exception:
+        file_path.unlink()
+        await loop.run_in_executor(None, prune_upload_index)
+        raise HTTPException(status_code=400, detail="File is not a readable video")
+    
+    return {"filename": file.filename, "path": str(file_path), "size": total_size, "checksum": checksum}
 
 
 @app.post("/api/split")
@@ -108,10 +187,7 @@ async def split_video(
     request: SplitRequest
 ):
     """Start video splitting process"""
-    global job_counter, jobs
-    
-    job_counter += 1
-    job_id = job_counter
+    job_id = await job_store.next_id()
     
     # Create job entry
     job = JobStatus(
@@ -120,7 +196,7 @@ async def split_video(
         message="Initializing video splitting...",
         created_at=datetime.now().isoformat()
     )
-    jobs[job_id] = job
+    await job_store.save(job)
     
     # Start background task
     background_tasks.add_task(process_video, job_id, filename, request)
@@ -131,25 +207,26 @@ async def split_video(
 @app.get("/api/jobs/{job_id}")
 async def get_job_status(job_id: int):
     """Get job status"""
-    if job_id not in jobs:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return jobs[job_id]
+    return job
 
 
 @app.get("/api/jobs")
 async def list_jobs():
     """List all jobs"""
-    return list(jobs.values())
+    return await job_store.list()
 
 
 @app.get("/api/download/{job_id}/{filename}")
-async def download_file(job_id: int, filename: str):
-    """Download a processed file"""
-    if job_id not in jobs:
+async def download_file(job_id: int, filename: str, request: Request):
+    """Download a processed file, honoring single byte ranges for seeking"""
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
     if filename not in job.output_files:
         raise HTTPException(status_code=404, detail="File not found")
     
@@ -157,15 +234,63 @@ async def download_file(job_id: int, filename: str):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found on disk")
     
-    return FileResponse(file_path, filename=filename)
+    # Same type for full and partial responses, so players seeking in the
+    # file keep treating it as video
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    
+    size = file_path.stat().st_size
+    range_header = request.headers.get("range")
+    byte_range = parse_range(range_header, size) if range_header else None
+    if byte_range is None:
+        return FileResponse(file_path, filename=filename, media_type=media_type,
+                            headers={"Accept-Ranges": "bytes"})
+    
+    start, end = byte_range
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+    }
+    return StreamingResponse(read_file_range(file_path, start, end), status_code=206,
+                             media_type=media_type, headers=headers)
+
+
+@app.get("/api/thumbnail/{job_id}/{index}")
+async def get_thumbnail(job_id: int, index: int):
+    """Preview image of a processed file"""
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not 0 <= index < len(job.output_files):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    stem = Path(job.output_files[index]).stem
+    file_path = Path("outputs") / str(job_id) / "thumbnails" / f"{stem}.jpg"
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    
+    return FileResponse(file_path, media_type="image/jpeg")
+
+
+def get_job_semaphore() -> asyncio.Semaphore:
+    """Semaphore limiting concurrent jobs, created on the server's event loop"""
+    global job_semaphore
+    if job_semaphore is None:
+        job_semaphore = asyncio.Semaphore(MAX_JOBS)
+    return job_semaphore
 
 
 async def process_video(job_id: int, filename: str, request: SplitRequest):
     """Background task to process video"""
+    job = await job_store.get(job_id)
     try:
-        job = jobs[job_id]
         job.status = "processing"
         job.message = "Setting up video processing..."
+        await job_store.save(job)
         
         # Setup paths
         input_path = Path("uploads") / filename
@@ -180,11 +305,14 @@ async def process_video(job_id: int, filename: str, request: SplitRequest):
             directory=output_dir,
             format=request.format,
             naming_pattern=request.naming_pattern,
-            max_segment_length=request.max_length
+            max_segment_length=request.max_length,
+            # Segments are played in the browser, let it stream them
+            fragmented=True
         )
         
         processing_config = ProcessingConfig(
-            quality=request.quality
+            quality=request.quality,
+            threads=THREADS_PER_JOB
         )
         
         config = Config(
@@ -193,18 +321,40 @@ async def process_video(job_id: int, filename: str, request: SplitRequest):
             processing=processing_config
         )
         
-        # Update job status
-        job.message = "Analyzing video file..."
-        
-        # Create splitter and process
-        splitter = Splitter(config)
-        
-        # Mock progress updates (since we can't easily hook into FFmpeg progress)
-        job.message = "Splitting video into segments..."
-        job.progress = 25
-        
-        # Run the actual splitting
-        output_files = splitter.process()
+        # Wait for a free slot so that jobs don't fight over the CPUs
+        job.message = "Waiting for other jobs to finish..."
+        await job_store.save(job)
+        async with get_job_semaphore():
+            # Update job status
+            job.message = "Analyzing video file..."
+            
+            # Create splitter and process
+            splitter = Splitter(config, probe_cache_dir=UPLOAD_INDEX_DIR)
+            
+            job.message = "Splitting video into segments..."
+            await job_store.save(job)
+            
+            # FFmpeg reports how far it got, publish it whenever the
+            # percentage changes. The last few percent cover the previews.
+            pending_saves = set()
+            
+            def report_progress(fraction: float) -> None:
+                percent = int(fraction * 95)
+                if percent > job.progress:
+                    job.progress = percent
+                    task = asyncio.ensure_future(job_store.save(job))
+                    pending_saves.add(task)
+                    task.add_done_callback(pending_saves.discard)
+            
+            # FFmpeg runs as child processes awaited on the event loop, so
+            # other requests are served while the split is running
+            output_files = await splitter.process_async(report_progress)
+            await asyncio.gather(*pending_saves)
+            
+            job.message = "Generating previews..."
+            await job_store.save(job)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, splitter.generate_thumbnails, output_files)
         
         # Update job with results
         job.status = "completed"
@@ -212,13 +362,14 @@ async def process_video(job_id: int, filename: str, request: SplitRequest):
         job.message = f"Successfully created {len(output_files)} segments"
         job.completed_at = datetime.now().isoformat()
         job.output_files = [f.name for f in output_files]
+        await job_store.save(job)
         
     except Exception as e:
-        job = jobs[job_id]
         job.status = "failed"
         job.error = str(e)
         job.message = f"Error: {str(e)}"
         job.completed_at = datetime.now().isoformat()
+        await job_store.save(job)
 
 
 if __name__ == "__main__":
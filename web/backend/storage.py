@@ -0,0 +1,120 @@
+"""Upload and download file handling for the web backend
+
+Kept apart from the FastAPI app so it can be used and tested without it.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from stream_splitter.video_processor import VideoProcessor
+
+
+# Uploads are copied to disk in blocks of this size
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+# Uploads are hard-linked here by checksum; the probe cache is kept here too
+# so that every job and server process reuses the results for a file
+UPLOAD_INDEX_DIR = Path("uploads") / ".index"
+
+# Ranged downloads are streamed from disk in blocks of this size
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def save_upload(header: bytes, source: BinaryIO, file_path: Path) -> Tuple[int, str]:
+    """Copy an uploaded file to disk, return its size and checksum (blocking)
+    
+    Files are indexed by content in UPLOAD_INDEX_DIR; a re-upload of a
+    known file is replaced by a hard link to the first copy, so it keeps
+    the original's modification time and its shared probe cache entry.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    # Never truncate in place: the old file may be linked from the index
+    file_path.unlink(missing_ok=True)
+    with open(file_path, "wb", buffering=0) as buffer:
+        # The header was already read from the upload for the signature check
+        digest.update(header)
+        buffer.write(header)
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            buffer.write(chunk)
+    checksum = digest.hexdigest()
+    
+    indexed = UPLOAD_INDEX_DIR / checksum
+    try:
+        os.link(file_path, indexed)
+    except FileExistsError:
+        if not os.path.samefile(file_path, indexed):
+            # Swap in the link atomically so the indexed copy always has a second link
+            temp_link = file_path.with_name(f".{file_path.name}.link")
+            temp_link.unlink(missing_ok=True)
+            os.link(indexed, temp_link)
+            os.replace(temp_link, file_path)
+    except OSError:
+        pass  # Hard links unsupported here, keep the plain copy
+    
+    # A re-upload under the same name may have orphaned an older version
+    prune_upload_index()
+    return file_path.stat().st_size, checksum
+
+
+def prune_upload_index() -> None:
+    """Remove indexed uploads no longer linked from the uploads directory (blocking)"""
+    removed = False
+    with os.scandir(UPLOAD_INDEX_DIR) as entries:
+        for entry in entries:
+            # Dot files, like the probe cache, aren't uploads
+            if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                continue
+            if entry.stat(follow_symlinks=False).st_nlink == 1:
+                Path(entry.path).unlink(missing_ok=True)
+                removed = True
+    
+    # Forget probe results of replaced and rejected uploads too
+    if removed:
+        VideoProcessor(cache_dir=UPLOAD_INDEX_DIR).prune_probe_cache()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=START-END" Range header into inclusive offsets
+
+    Returns None when the header should be ignored and the whole file sent:
+    other units, multiple ranges and malformed values. A start at or past
+    the end of the file is returned as is, it can't be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if end < start and start < size:
+                return None
+        else:
+            # "bytes=-N" asks for the last N bytes
+            suffix = int(last)
+            if suffix == 0:
+                return size, size
+            start = max(size - suffix, 0)
+            end = size - 1
+    except ValueError:
+        return None
+    return start, end
+
+
+def read_file_range(file_path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Yield the bytes from start to end (inclusive) of a file in blocks"""
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
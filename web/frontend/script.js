@@ -293,10 +293,11 @@ function showResults(job) {
 
     // Generate download links
     downloadList.innerHTML = '';
-    job.output_files.forEach(filename => {
+    job.output_files.forEach((filename, index) => {
         const downloadItem = document.createElement('div');
         downloadItem.className = 'download-item';
         downloadItem.innerHTML = `
+            <img class="download-thumbnail" src="/api/thumbnail/${job.id}/${index}" alt="" onerror="this.remove()">
             <span class="download-filename">${filename}</span>
             <a href="/api/download/${job.id}/${filename}" class="download-btn" download>
                 📥 Download